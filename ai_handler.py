@@ -8,16 +8,20 @@ warnings.simplefilter("ignore")
 
 from pathlib import Path
 
-# Try importing the new library first
-try:
-    from google import genai
-except ImportError:
-    # If not found, try the old one but warn to stderr (not stdout)
+def _load_genai():
+    """Imports the Gemini SDK. Called only when AI is enabled: it takes longer
+    to import than the rest of the server together."""
+    # Try importing the new library first
     try:
-        import google.generativeai as genai
+        from google import genai
     except ImportError:
-        sys.stderr.write("Error: google-genai library not found. Please run: pip install google-genai\n")
-        genai = None
+        # If not found, try the old one but warn to stderr (not stdout)
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            sys.stderr.write("Error: google-genai library not found. Please run: pip install google-genai\n")
+            genai = None
+    return genai
 
 class AIHandler:
     def __init__(self, enabled=False, model="gemini-3.1-pro-preview"):
@@ -32,12 +36,14 @@ class AIHandler:
             if not api_key:
                 sys.stderr.write("Warning: AI_ENABLED is true but GOOGLE_API_KEY is missing.\n")
                 self.enabled = False
-            elif genai:
-                try:
-                    self.client = genai.Client(api_key=api_key)
-                except Exception as e:
-                    sys.stderr.write(f"Failed to initialize Gemini client: {e}\n")
-                    self.enabled = False
+            else:
+                genai = _load_genai()
+                if genai:
+                    try:
+                        self.client = genai.Client(api_key=api_key)
+                    except Exception as e:
+                        sys.stderr.write(f"Failed to initialize Gemini client: {e}\n")
+                        self.enabled = False
 
     def _read_file_snippet(self, file_path: str, max_chars=2000) -> str:
         """Reads a snippet of the file to send to the AI."""
@@ -0,0 +1,141 @@
+"""
+bench_arranque.py
+─────────────────
+Presupuesto de arranque del servidor MCP.
+
+Cada sesión del cliente MCP lanza un servidor nuevo, así que lo que tarda
+`import main` lo espera el usuario cada vez. Este script lo mide en procesos
+nuevos y falla (código 1) si:
+
+    - `import main` tarda más que el presupuesto (según -X importtime), o
+    - al arrancar se importó algo que debe cargarse recién al usarse
+      (el SDK de Gemini, que solo hace falta para generate_ai_metadata).
+
+También reporta el tiempo de pared de `python -c "import main"` descontando
+el arranque del intérprete, y los imports que más pesan.
+
+    python bench_arranque.py
+    python bench_arranque.py --presupuesto-ms 800 --repeticiones 10 --salida arranque.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from datetime import datetime
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que no deben cargarse al arrancar
+PROHIBIDOS = ("google.genai", "google.generativeai", "ai_handler")
+
+PRESUPUESTO_MS = 1000
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MEDICIÓN
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _entorno() -> dict:
+    # El log de arranque escribiría en el repo en cada corrida
+    entorno = dict(os.environ)
+    entorno.pop("DEBUG_START_LOG", None)
+    return entorno
+
+
+def _python(*args, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + list(args)
+    return subprocess.run(cmd, cwd=DIR, env=_entorno(), capture_output=True, text=True)
+
+
+def medir_importtime() -> tuple:
+    """Lee la salida de -X importtime de `import main`. Devuelve ({módulo:
+    acumulado µs} de todo lo importado, [(módulo, acumulado µs)] de los
+    imports directos de main)."""
+    r = _python("-c", "import main", importtime=True)
+    if r.returncode != 0:
+        raise RuntimeError(f"import main falló:\n{r.stderr[-2000:]}")
+    modulos, directos = {}, []
+    # Cada módulo se lista al terminar de importarse, después de los que él
+    # importó; los del arranque del intérprete vienen antes que los de main
+    for linea in r.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        nivel = (len(nombre) - len(nombre.lstrip(" "))) // 2
+        nombre = nombre.strip()
+        modulos[nombre] = int(acumulado)
+        if nivel == 0 and nombre != "main":
+            directos = []
+        elif nivel == 1:
+            directos.append((nombre, int(acumulado)))
+    return modulos, directos
+
+
+def medir_pared(repeticiones: int) -> tuple:
+    """(mejor ms de `import main`, mejor ms del intérprete solo)."""
+    def mejor(*args):
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            _python(*args)
+            tiempos.append(time.perf_counter() - t0)
+        return round(min(tiempos) * 1000, 1)
+    return mejor("-c", "import main"), mejor("-c", "pass")
+
+
+def correr(presupuesto_ms: float, repeticiones: int, top: int = 10) -> dict:
+    # La primera corrida compila los .pyc; no se cuenta
+    _python("-c", "import main")
+
+    modulos, directos = medir_importtime()
+    total_ms = round(modulos["main"] / 1000, 1)
+    propios = sorted(((m, a / 1000) for m, a in directos), key=lambda x: x[1], reverse=True)
+    cargados = [m for m in PROHIBIDOS if m in modulos]
+    pared_ms, interprete_ms = medir_pared(repeticiones)
+
+    print(f"⏱️  import main: {total_ms:.0f} ms (presupuesto {presupuesto_ms:.0f} ms)")
+    print(f"   arranque completo {pared_ms:.0f} ms, de los cuales {interprete_ms:.0f} ms son del intérprete\n")
+    print(f"   {'import':<32} {'ms':>8}")
+    for modulo, ms in propios[:top]:
+        print(f"   {modulo:<32} {ms:>8.1f}")
+
+    dentro = total_ms <= presupuesto_ms
+    print()
+    print(f"{'✅' if dentro else '❌'} import main {'dentro del' if dentro else 'excede el'} presupuesto.")
+    if cargados:
+        print(f"❌ Se importaron al arrancar: {', '.join(cargados)}")
+    else:
+        print("✅ Nada de la lista de carga diferida se importó al arrancar.")
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parametros": {"presupuesto_ms": presupuesto_ms, "repeticiones": repeticiones},
+        "import_main_ms": total_ms,
+        "arranque_ms": pared_ms,
+        "interprete_ms": interprete_ms,
+        "imports": [{"modulo": m, "ms": round(ms, 1)} for m, ms in propios[:top]],
+        "prohibidos_cargados": cargados,
+        "ok": dentro and not cargados,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Tiempo de arranque del servidor MCP contra un presupuesto")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS,
+                        help="Máximo aceptable para import main, en ms")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Arranques medidos (se toma el mejor)")
+    parser.add_argument("--top", type=int, default=10, help="Imports más pesados a mostrar")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    informe = correr(args.presupuesto_ms, args.repeticiones, top=args.top)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+    sys.exit(0 if informe["ok"] else 1)
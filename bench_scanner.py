@@ -0,0 +1,309 @@
+"""
+bench_scanner.py
+────────────────
+Benchmark del escáner sobre árboles sintéticos.
+
+Genera un árbol de prueba (ancho o profundo, con extensiones variadas,
+archivos que las reglas de exclusión deben omitir y nombres larguísimos que
+pasan por _recortar_nombre) y mide scan_directory en tres escenarios:
+
+    frio     → índice vacío, escaneo completo
+    tibio    → re-escaneo incremental sin cambios
+    parcial  → se modifica, borra y agrega un % de archivos y se re-escanea
+
+Por escenario reporta archivos/s, sentencias SQLite que lanza el escáner
+(cada execute/executemany y cada COMMIT cuenta una vez, sin importar cuántas
+filas lleve un executemany ni lo que ejecuten los triggers), pico de memoria
+(RSS) y tamaño de la BD. Cada escenario corre en un proceso nuevo
+para que el pico de RSS sea solo suyo. Los resultados se guardan en JSON
+para comparar corridas:
+
+    python bench_scanner.py --archivos 100000 --forma profunda
+    python bench_scanner.py --archivos 100000 --comparar bench_anterior.json
+
+Por defecto el árbol y la BD van a /dev/shm (tmpfs) si existe, para medir el
+escáner y no el disco.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+# Extensiones de los archivos "normales" del árbol
+EXTENSIONES = [".pdf", ".docx", ".xlsx", ".jpg", ".png", ".mp4", ".mp3", ".txt", ".md", ".py", ".zip"]
+
+# Archivos que las reglas de exclusión deben omitir
+IGNORABLES = ["desktop.ini", "Thumbs.db", "~$borrador.docx", ".oculto", "registro.log", "cache.tmp"]
+
+# Proporciones del árbol sintético
+PROPORCION_IGNORABLES = 0.05
+PROPORCION_NOMBRES_LARGOS = 0.02
+
+ESCENARIOS = ("frio", "tibio", "parcial")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ÁRBOL SINTÉTICO
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _carpetas(raiz: str, total_archivos: int, forma: str, por_carpeta: int) -> list:
+    """
+    Lista de carpetas del árbol.
+      ancha    → dos niveles: raiz/gNNN/cNNN, muchas carpetas hermanas
+      profunda → cadenas de hasta 40 niveles anidados
+    """
+    n = max(1, total_archivos // por_carpeta)
+    if forma == "ancha":
+        return [os.path.join(raiz, f"g{i // 100:03d}", f"c{i % 100:03d}") for i in range(n)]
+    carpetas, actual, nivel = [], raiz, 0
+    for i in range(n):
+        if nivel >= 40:
+            actual, nivel = raiz, 0
+        actual = os.path.join(actual, f"n{i:05d}")
+        nivel += 1
+        carpetas.append(actual)
+    return carpetas
+
+
+def generar_arbol(raiz: str, total_archivos: int, forma: str = "ancha",
+                  por_carpeta: int = 50, semilla: int = 42) -> dict:
+    """Crea el árbol sintético. Devuelve cuántos archivos de cada tipo creó."""
+    rnd = random.Random(semilla)
+    cuenta = {"normales": 0, "ignorables": 0, "nombres_largos": 0}
+    carpetas = _carpetas(raiz, total_archivos, forma, por_carpeta)
+    creados = 0
+    for carpeta in carpetas:
+        os.makedirs(carpeta, exist_ok=True)
+        for j in range(por_carpeta):
+            if creados >= total_archivos:
+                break
+            tirada = rnd.random()
+            if tirada < PROPORCION_IGNORABLES:
+                nombre = f"{j}_{rnd.choice(IGNORABLES)}" if rnd.random() < 0.5 else rnd.choice(IGNORABLES)
+                tipo = "ignorables"
+            elif tirada < PROPORCION_IGNORABLES + PROPORCION_NOMBRES_LARGOS:
+                # > MAX_FILENAME_LEN pero dentro del límite de 255 del sistema de archivos
+                nombre = f"{j}_" + "nombre_muy_largo_" * 12 + rnd.choice(EXTENSIONES)
+                tipo = "nombres_largos"
+            else:
+                nombre = f"archivo_{j:04d}{rnd.choice(EXTENSIONES)}"
+                tipo = "normales"
+            ruta = os.path.join(carpeta, nombre)
+            if os.path.exists(ruta):
+                continue
+            with open(ruta, "wb") as f:
+                f.write(b"x" * rnd.randint(0, 256))
+            cuenta[tipo] += 1
+            creados += 1
+    return cuenta
+
+
+def cambiar_parcialmente(raiz: str, proporcion: float, semilla: int = 7) -> dict:
+    """Modifica, borra y agrega archivos (cada uno ~proporcion/3 del total)."""
+    rnd = random.Random(semilla)
+    archivos = sorted(
+        os.path.join(r, f) for r, _, fs in os.walk(raiz) for f in fs
+    )
+    k = max(1, int(len(archivos) * proporcion / 3))
+    elegidos = rnd.sample(archivos, min(len(archivos), 2 * k))
+    modificar, borrar = elegidos[:k], elegidos[k:]
+    futuro = time.time() + 60
+    for ruta in modificar:
+        with open(ruta, "ab") as f:
+            f.write(b"cambio")
+        os.utime(ruta, (futuro, futuro))
+    for ruta in borrar:
+        os.remove(ruta)
+    for i in range(k):
+        carpeta = os.path.dirname(rnd.choice(archivos))
+        if os.path.isdir(carpeta):
+            with open(os.path.join(carpeta, f"nuevo_{i:06d}.txt"), "wb") as f:
+                f.write(b"nuevo")
+    return {"modificados": len(modificar), "borrados": len(borrar), "agregados": k}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MEDICIÓN (en un proceso hijo por escenario)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _rss_pico_mb():
+    """Pico de RSS del proceso actual en MB (None si no se puede medir)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux lo da en KB, macOS en bytes
+        return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def _medir(cola, db_path: str, raiz: str, incremental: bool, workers: int):
+    """Corre un escaneo y deja en la cola {segundos, sentencias, rss_pico_mb}."""
+    import database
+    import scanner
+
+    database.DB_PATH = db_path
+    sentencias = [0]
+
+    # Se cuentan las llamadas del código, no el trace callback de SQLite: éste
+    # se dispara por cada fila de un executemany y por cada sentencia de un
+    # trigger, con el mismo texto que la sentencia que lo disparó
+    class _CursorContado(sqlite3.Cursor):
+        def execute(self, *args):
+            sentencias[0] += 1
+            return super().execute(*args)
+
+        def executemany(self, *args):
+            sentencias[0] += 1
+            return super().executemany(*args)
+
+    class _ConexionContada(sqlite3.Connection):
+        def cursor(self, factory=_CursorContado):
+            return super().cursor(factory)
+
+        def execute(self, *args):
+            return self.cursor().execute(*args)
+
+        def executemany(self, *args):
+            return self.cursor().executemany(*args)
+
+        def commit(self):
+            if self.in_transaction:
+                sentencias[0] += 1
+            super().commit()
+
+    def _conexion_contada():
+        return database.get_db_connection(db_path, factory=_ConexionContada)
+
+    scanner.get_db_connection = _conexion_contada
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w", encoding="utf-8")):
+        scanner.scan_directory(raiz, incremental=incremental, workers=workers)
+    cola.put({
+        "segundos":    round(time.perf_counter() - inicio, 3),
+        "sentencias":  sentencias[0],
+        "rss_pico_mb": _rss_pico_mb(),
+    })
+
+
+def medir_escenario(db_path: str, raiz: str, incremental: bool, workers: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    cola = ctx.Queue()
+    proceso = ctx.Process(target=_medir, args=(cola, db_path, raiz, incremental, workers))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def correr(total_archivos: int, forma: str, workers: int, proporcion_cambios: float,
+           base_temporal: str = None, conservar: bool = False) -> dict:
+    """Genera el árbol, corre los tres escenarios y devuelve el informe."""
+    if base_temporal is None and os.path.isdir("/dev/shm"):
+        base_temporal = "/dev/shm"
+    trabajo = tempfile.mkdtemp(prefix="bench_scanner_", dir=base_temporal)
+    raiz    = os.path.join(trabajo, "arbol")
+    db_path = os.path.join(trabajo, "files.db")
+
+    informe = {
+        "fecha":     datetime.now().isoformat(timespec="seconds"),
+        "commit":    _commit_actual(),
+        "python":    platform.python_version(),
+        "sqlite":    sqlite3.sqlite_version,
+        "sistema":   platform.platform(),
+        "parametros": {
+            "archivos": total_archivos, "forma": forma, "workers": workers,
+            "proporcion_cambios": proporcion_cambios, "directorio": trabajo,
+        },
+        "resultados": [],
+    }
+    try:
+        print(f"🌳 Generando árbol {forma} de {total_archivos} archivos en {raiz} …")
+        t0 = time.perf_counter()
+        informe["arbol"] = generar_arbol(raiz, total_archivos, forma)
+        print(f"   listo en {time.perf_counter() - t0:.1f}s: {informe['arbol']}")
+
+        for escenario in ESCENARIOS:
+            if escenario == "parcial":
+                informe["cambios"] = cambiar_parcialmente(raiz, proporcion_cambios)
+            res = medir_escenario(db_path, raiz, incremental=(escenario != "frio"), workers=workers)
+            res["escenario"]  = escenario
+            res["archivos_s"] = round(total_archivos / res["segundos"], 1) if res["segundos"] else None
+            res["db_mb"]      = round(os.path.getsize(db_path) / (1024 * 1024), 2)
+            informe["resultados"].append(res)
+            print(f"   ⏱️  {escenario:<8} {res['segundos']:>8.2f}s  {res['archivos_s'] or 0:>10,.0f} archivos/s  "
+                  f"{res['sentencias']:>9} sentencias  RSS {res['rss_pico_mb']} MB  BD {res['db_mb']} MB")
+    finally:
+        if not conservar:
+            shutil.rmtree(trabajo, ignore_errors=True)
+    return informe
+
+
+def comparar(actual: dict, anterior: dict):
+    """Imprime la variación de archivos/s y sentencias respecto de otra corrida."""
+    previos = {r["escenario"]: r for r in anterior.get("resultados", [])}
+    print(f"\n📊 Comparación con {anterior.get('fecha')} (commit {anterior.get('commit')}):")
+    distintos = [
+        k for k in ("archivos", "forma", "workers", "proporcion_cambios")
+        if actual["parametros"].get(k) != anterior.get("parametros", {}).get(k)
+    ]
+    if distintos:
+        print(f"   ⚠️  Parámetros distintos ({', '.join(distintos)}): la comparación es orientativa.")
+    for r in actual["resultados"]:
+        p = previos.get(r["escenario"])
+        if not p or not p.get("archivos_s") or not r.get("archivos_s"):
+            continue
+        cambio = (r["archivos_s"] / p["archivos_s"] - 1) * 100
+        print(f"   {r['escenario']:<8} archivos/s {p['archivos_s']:>10,.0f} → {r['archivos_s']:>10,.0f} "
+              f"({cambio:+.1f}%)   sentencias {p['sentencias']} → {r['sentencias']}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark del escáner sobre árboles sintéticos")
+    parser.add_argument("--archivos", type=int, default=10_000, help="Archivos del árbol (10k a 1M)")
+    parser.add_argument("--forma", choices=["ancha", "profunda"], default="ancha")
+    parser.add_argument("--workers", type=int, default=1, help="Hilos del recorrido (scan_directory)")
+    parser.add_argument("--cambios", type=float, default=0.05,
+                        help="Proporción de archivos tocados en el escenario parcial")
+    parser.add_argument("--dir", default=None, help="Dónde crear el árbol (por defecto /dev/shm o temp)")
+    parser.add_argument("--conservar", action="store_true", help="No borrar el árbol ni la BD al terminar")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    informe = correr(args.archivos, args.forma, args.workers, args.cambios,
+                     base_temporal=args.dir, conservar=args.conservar)
+    salida = args.salida or f"bench_scanner_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {salida}")
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(informe, json.load(f))
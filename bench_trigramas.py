@@ -0,0 +1,194 @@
+"""
+bench_trigramas.py
+──────────────────
+Benchmark del índice de trigramas (files_path_tri) contra LIKE '%texto%'.
+
+Llena una BD temporal con rutas sintéticas estilo Windows (500k por defecto),
+activa el índice y mide, para varios fragmentos de ruta, los filtros
+"Nombre/Ruta" incluir y excluir tal como los arma gestor.buscar_archivos_pc:
+una vez con el LIKE de siempre y otra con database.path_like_filter. Cada
+consulta debe devolver exactamente las mismas filas por los dos caminos; si
+no, se marca con ❌.
+
+También reporta cuánto tarda en construirse el índice y cuánto crece la BD.
+
+    python bench_trigramas.py
+    python bench_trigramas.py --filas 1000000 --repeticiones 5 --salida tri.json
+
+Por defecto la BD va a /dev/shm (tmpfs) si existe, para medir las consultas y
+no el disco.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import database
+
+# Vocabulario de las rutas sintéticas
+RAICES = [r"C:\Users\Leo", r"C:\Users\Leo\OneDrive", r"D:\Respaldo", r"E:\Fotos"]
+CARPETAS = ["Documents", "Descargas", "Escritorio", "Música", "Imágenes", "Proyectos",
+            "Universidad", "Trabajo", "Facturas", "Clientes", "Informes", "Personal"]
+SUBCARPETAS = [str(a) for a in range(2015, 2025)] + [f"Semestre {s}" for s in range(1, 9)] + \
+              ["enero", "febrero", "marzo", "abril", "mayo", "junio", "Varios", "Viejos"]
+NOMBRES = ["reporte", "informe", "factura", "foto", "notas", "presentacion", "contrato",
+           "resumen", "tarea", "cancion", "video", "captura", "Reporte_Anual", "IMG"]
+SUFIJOS = ["", "", "", "_final", "_v2", "_copia", " (1)"]
+EXTENSIONES = [".pdf", ".docx", ".xlsx", ".jpg", ".png", ".mp4", ".mp3", ".txt", ".zip"]
+
+# (fragmento, comentario) — los de menos de 3 caracteres no pueden usar el índice
+FRAGMENTOS = [
+    ("Documents", "carpeta frecuente"),
+    ("reporte",   "nombre, también dentro de Reporte_Anual"),
+    ("2019",      "año en la ruta"),
+    ("Música",    "con tilde"),
+    ("_final",    "'_' es comodín de LIKE"),
+    ("Semestre 7", "dos palabras"),
+    ("qzxw",      "sin coincidencias"),
+    ("v2",        "corto: siempre LIKE"),
+]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# BD SINTÉTICA
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _filas_sinteticas(total: int, semilla: int = 42):
+    rnd = random.Random(semilla)
+    base = datetime(2024, 1, 1)
+    for i in range(total):
+        ext = rnd.choice(EXTENSIONES)
+        nombre = f"{rnd.choice(NOMBRES)}_{i}{rnd.choice(SUFIJOS)}{ext}"
+        carpeta = "\\".join([rnd.choice(RAICES), rnd.choice(CARPETAS)] +
+                            rnd.sample(SUBCARPETAS, rnd.randint(0, 3)))
+        fecha = base - timedelta(minutes=rnd.randint(0, 5_000_000))
+        yield (f"{carpeta}\\{nombre}", nombre, ext, rnd.randint(1, 50_000_000), fecha, fecha)
+
+
+def llenar_bd(db_path: str, filas: int, lote: int = 20_000):
+    conn = database.get_db_connection(db_path)
+    database.ensure_schema(conn)
+    sql = ("INSERT INTO files (path, filename, extension, size, created_at, modified_at) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+    pendientes = []
+    for fila in _filas_sinteticas(filas):
+        pendientes.append(fila)
+        if len(pendientes) >= lote:
+            conn.executemany(sql, pendientes)
+            conn.commit()
+            pendientes.clear()
+    if pendientes:
+        conn.executemany(sql, pendientes)
+        conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _tamano_bd_mb(db_path: str) -> float:
+    total = sum(os.path.getsize(db_path + s) for s in ("", "-wal") if os.path.exists(db_path + s))
+    return round(total / 1_048_576, 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MEDICIÓN
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _consulta(condicion: str) -> str:
+    """La consulta de gestor.buscar_archivos_pc, solo con el filtro de ruta."""
+    return ("SELECT f.id FROM files f LEFT JOIN descriptions d ON f.id=d.file_id "
+            f"WHERE 1=1 AND {condicion} ORDER BY f.modified_at DESC")
+
+
+def _medir(conn, sql: str, parametro: str, repeticiones: int):
+    """(ids devueltos, mejor tiempo en ms) de `repeticiones` corridas."""
+    mejor, ids = None, None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        ids = [r[0] for r in conn.execute(sql, (parametro,))]
+        dt = time.perf_counter() - t0
+        mejor = dt if mejor is None else min(mejor, dt)
+    return ids, round(mejor * 1000, 2)
+
+
+def correr(filas: int, repeticiones: int, base_temporal: str = None, conservar: bool = False) -> dict:
+    if base_temporal is None and os.path.isdir("/dev/shm"):
+        base_temporal = "/dev/shm"
+    trabajo = tempfile.mkdtemp(prefix="bench_tri_", dir=base_temporal)
+    db_path = os.path.join(trabajo, "files.db")
+    try:
+        print(f"🧪 Llenando BD con {filas:,} rutas en {trabajo} ...")
+        t0 = time.perf_counter()
+        llenar_bd(db_path, filas)
+        print(f"   listo en {time.perf_counter() - t0:.1f}s")
+
+        conn = database.get_db_connection(db_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        tamano_sin = _tamano_bd_mb(db_path)
+        t0 = time.perf_counter()
+        database.enable_trigram_index(conn)
+        construccion = time.perf_counter() - t0
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        tamano_con = _tamano_bd_mb(db_path)
+        print(f"🔧 Índice de trigramas: {construccion:.1f}s, BD {tamano_sin} MB → {tamano_con} MB\n")
+
+        resultados, todo_igual = [], True
+        print(f"   {'fragmento':<12} {'filtro':<8} {'filas':>9} {'LIKE ms':>10} {'trigr. ms':>10} {'×':>7}")
+        for fragmento, comentario in FRAGMENTOS:
+            for excluir in (False, True):
+                like = f"f.path {'NOT LIKE' if excluir else 'LIKE'} ?"
+                ids_like, ms_like = _medir(conn, _consulta(like), f"%{fragmento}%", repeticiones)
+                cond, patron = database.path_like_filter(conn, fragmento, exclude=excluir)
+                ids_tri, ms_tri = _medir(conn, _consulta(cond), patron, repeticiones)
+                igual = len(ids_like) == len(ids_tri) and set(ids_like) == set(ids_tri)
+                todo_igual &= igual
+                veces = round(ms_like / ms_tri, 1) if ms_tri else None
+                filtro = "excluir" if excluir else "incluir"
+                print(f"   {fragmento:<12} {filtro:<8} {len(ids_like):>9,} {ms_like:>10.1f} {ms_tri:>10.1f} "
+                      f"{veces if veces is not None else '-':>7} {'✅' if igual else '❌'}")
+                resultados.append({
+                    "fragmento": fragmento, "comentario": comentario, "filtro": filtro,
+                    "filas": len(ids_like), "like_ms": ms_like, "trigramas_ms": ms_tri,
+                    "aceleracion": veces, "mismo_resultado": igual,
+                })
+        conn.close()
+
+        print("\n" + ("✅ Mismos resultados en todas las consultas." if todo_igual
+                      else "❌ Hay consultas con resultados distintos."))
+        return {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "sqlite": database.sqlite3.sqlite_version,
+            "parametros": {"filas": filas, "repeticiones": repeticiones},
+            "indice": {"construccion_s": round(construccion, 2),
+                       "bd_sin_mb": tamano_sin, "bd_con_mb": tamano_con},
+            "mismo_resultado": todo_igual,
+            "resultados": resultados,
+        }
+    finally:
+        if conservar:
+            print(f"📁 BD conservada en {db_path}")
+        else:
+            shutil.rmtree(trabajo, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Índice de trigramas contra LIKE '%texto%' en rutas")
+    parser.add_argument("--filas", type=int, default=500_000, help="Rutas sintéticas en la BD")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Corridas por consulta (se toma la mejor)")
+    parser.add_argument("--dir", default=None, help="Dónde crear la BD (por defecto /dev/shm o temp)")
+    parser.add_argument("--conservar", action="store_true", help="No borrar la BD al terminar")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    informe = correr(args.filas, args.repeticiones, base_temporal=args.dir, conservar=args.conservar)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+    sys.exit(0 if informe["mismo_resultado"] else 1)
@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from database import get_db_connection, ensure_schema, fts_match, FTS_RANK
 
 db_path = os.path.join(os.path.dirname(__file__), "files.db")
 
@@ -15,31 +16,23 @@ def buscar_archivos_avanzado():
     dias = input("6. Modificado en los últimos N días (ej. 7, 30): ").strip()
     sin_info = input("7. ¿Mostrar SOLO archivos SIN descripción ni etiquetas? (s / ENTER para no): ").strip().lower()
 
+    # Los filtros de texto van al índice de texto completo (files_fts): palabras
+    # por prefijo, sin distinguir tildes ni mayúsculas, ordenadas por relevancia
+    texto = [fts_match(nombre, ["filename"]), fts_match(ubicacion, ["path"]),
+             fts_match(tag, ["tags"]), fts_match(descripcion, ["description"])]
+    texto = " AND ".join(t for t in texto if t)
+
     # Construir la consulta SQL dinámicamente
     query = """
         SELECT DISTINCT f.id, f.filename, f.path, f.size, d.description, d.source, f.modified_at
         FROM files f
         LEFT JOIN descriptions d ON f.id = d.file_id
-        LEFT JOIN metadata m ON f.id = m.file_id AND m.key = 'tag'
-        WHERE 1=1
     """
     params = []
-
-    if nombre:
-        query += " AND f.filename LIKE ?"
-        params.append(f"%{nombre}%")
-        
-    if ubicacion:
-        query += " AND f.path LIKE ?"
-        params.append(f"%{ubicacion}%")
-        
-    if tag:
-        query += " AND m.value LIKE ?"
-        params.append(f"%{tag}%")
-        
-    if descripcion:
-        query += " AND d.description LIKE ?"
-        params.append(f"%{descripcion}%")
+    if texto:
+        query += " JOIN files_fts ON files_fts.rowid = f.id AND files_fts MATCH ?"
+        params.append(texto)
+    query += " WHERE f.missing_since IS NULL"
         
     if tipo:
         if not tipo.startswith('.'):
@@ -54,12 +47,12 @@ def buscar_archivos_avanzado():
         # Filtramos donde no haya descripciones ni etiquetas
         query += " AND d.id IS NULL AND f.id NOT IN (SELECT file_id FROM metadata WHERE key='tag')"
 
-    query += " ORDER BY f.modified_at DESC LIMIT 50"
+    query += f" ORDER BY {FTS_RANK if texto else 'f.modified_at DESC'} LIMIT 50"
 
     print("\n⏳ Buscando...")
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = get_db_connection(db_path)
+    ensure_schema(conn)
     c = conn.cursor()
     
     try:
@@ -2,18 +2,287 @@ import sqlite3
 from datetime import datetime
 from pathlib import Path
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "files.db")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Serializes write transactions between threads of the same process (e.g.
+# several background scans of the MCP server): they walk in parallel, but only
+# one of them writes to files.db at a time. Reentrant because some write steps
+# call others (move detection hashes its candidates).
+write_lock = threading.RLock()
+
+# Every connection to files.db (MCP server, scanner, watcher, gestores and
+# scripts) goes through get_db_connection so they all share these settings.
+# With WAL, readers keep working while a scan or gestor.py is writing, and the
+# busy timeout makes a second writer wait instead of failing with
+# "database is locked".
+BUSY_TIMEOUT_SEC = 30
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",      # durable at checkpoints; safe with WAL
+    "PRAGMA cache_size = -65536",       # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456",     # 256 MiB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+def get_db_connection(db_path=None, **connect_args):
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=BUSY_TIMEOUT_SEC, **connect_args)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
+def backup_db(dest_path, db_path=None):
+    """Consistent copy of the database, including changes still in the WAL file.
+    Copying files.db by hand would miss them once WAL is on."""
+    src = get_db_connection(db_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+# Prepared statements kept per pooled connection. The MCP tools use a few
+# dozen fixed statements; the headroom keeps them cached while query_database
+# runs ad-hoc SQL through the same connections.
+CACHED_STATEMENTS = 256
+
+class ConnectionPool:
+    """Long-lived connections for a server process, so each call reuses a warm
+    page cache and prepared statements instead of reconnecting.
+
+    reader() lends one of up to `readers` query-only connections (WAL lets them
+    run while something writes); writer() lends the single write connection
+    while holding write_lock, and commits or rolls back when the block ends.
+    Connections are opened on first use."""
+
+    def __init__(self, db_path=None, readers=4, cached_statements=CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self._slots = threading.BoundedSemaphore(readers)
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._writer = None
+        self._closed = False
+
+    def _connect(self):
+        return get_db_connection(self.db_path, check_same_thread=False,
+                                 cached_statements=self.cached_statements)
+
+    @contextmanager
+    def reader(self):
+        self._slots.acquire()
+        try:
+            with self._idle_lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+                conn.execute("PRAGMA query_only = ON")
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._idle_lock:
+                    if self._closed:
+                        conn.close()
+                    else:
+                        self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def writer(self):
+        with write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self):
+        with self._idle_lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SANDBOXED QUERIES
+# query_database runs SQL written by the MCP client. Besides running on a
+# query-only connection, the statement goes through an authorizer that only
+# lets reads through, and a progress handler that stops it at a deadline, so
+# an accidental cross join can't pin the CPU for minutes.
+# ─────────────────────────────────────────────────────────────────────────────
+
+_READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                 sqlite3.SQLITE_RECURSIVE}
+# Pragmas that only report; FTS5 reads data_version on its own
+READ_ONLY_PRAGMAS = {"data_version", "table_info", "table_xinfo", "table_list", "index_list",
+                     "index_info", "index_xinfo", "foreign_key_list"}
+PROGRESS_STEPS = 10_000  # SQLite VM steps between deadline checks
+
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    if action in _READ_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and arg1 in READ_ONLY_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    # Opening files_fts declares its virtual table, which SQLite authorizes as
+    # an update of sqlite_master; a real one is refused by SQLite anyway
+    if action == sqlite3.SQLITE_UPDATE and arg1 == "sqlite_master":
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+@contextmanager
+def sandboxed(conn, timeout=None):
+    """Lends conn with the read-only authorizer and, if timeout is given, stops
+    any statement still running after `timeout` seconds. A denied statement
+    fails with sqlite3.DatabaseError 'not authorized', a stopped one with
+    sqlite3.OperationalError 'interrupted'. Both are removed afterwards, so
+    pooled connections can be lent this way."""
+    conn.set_authorizer(_read_only_authorizer)
+    if timeout:
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        yield conn
+    finally:
+        conn.set_authorizer(None)
+        conn.set_progress_handler(None, 0)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# RESULT CACHE
+# Clients tend to repeat the same aggregate queries (COUNT(*), SUM(size) per
+# extension). ResultCache keeps their results until something writes to the
+# database, detected with PRAGMA data_version: it changes on a connection
+# whenever another connection (of this or any other process) commits.
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Comments and quoted text/identifiers are kept verbatim by normalize_sql
+_SQL_VERBATIM = re.compile(r"""(--[^\n]*\n?|/\*.*?\*/|'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])""",
+                           re.DOTALL)
+# Results of queries calling these depend on more than the data
+_VOLATILE_SQL = re.compile(r"\b(random|randomblob|date|time|datetime|julianday|strftime|unixepoch|"
+                           r"changes|total_changes|last_insert_rowid|current_date|current_time|"
+                           r"current_timestamp)\b", re.IGNORECASE)
+
+def normalize_sql(query):
+    """Collapses runs of whitespace outside quotes and comments and drops
+    trailing semicolons, so queries that differ only in layout share a key."""
+    parts = _SQL_VERBATIM.split(query)
+    parts[::2] = [re.sub(r"\s+", " ", p) for p in parts[::2]]
+    return "".join(parts).strip().rstrip(";").strip()
+
+def is_cacheable_sql(query):
+    return _VOLATILE_SQL.search(query) is None
+
+class ResultCache:
+    """LRU cache of query results for a server process, bounded by the total
+    size of the cached values (strings). get() returns (value, version); pass
+    that version to put() so a result read while a write committed is not
+    stored. The whole cache is dropped when data_version changes."""
+
+    def __init__(self, db_path=None, max_bytes=16 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stamp = None      # connection only used to read data_version
+        self._version = None
+        self.hits = self.misses = self.invalidations = 0
+
+    def _current_version(self):
+        if self._stamp is None:
+            self._stamp = get_db_connection(self.db_path, check_same_thread=False)
+        version = self._stamp.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return version
+
+    def get(self, key):
+        with self._lock:
+            version = self._current_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, version
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], version
+
+    def put(self, key, value, version):
+        size = len(value) + len(key[0])
+        with self._lock:
+            if size > self.max_bytes or self._current_version() != version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "invalidations": self.invalidations,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._stamp is not None:
+                self._stamp.close()
+                self._stamp = None
+
+def path_prefix_range(root):
+    """Returns (low, high) so that `path >= low AND path < high` matches every
+    path under root. Unlike LIKE 'root%' it uses the UNIQUE index on files.path
+    and is not fooled by '_' or '%' in real folder names."""
+    prefix = str(root)
+    if not prefix.endswith(os.sep):
+        prefix += os.sep
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _add_column_if_missing(c, table, column, decl):
+    cols = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MIGRATIONS
+# Each migration moves the schema from version N-1 to N (PRAGMA user_version).
+# Databases created before versioning report version 0 but may already have
+# some of these objects, so the early steps use IF NOT EXISTS / add-if-missing.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _m1_base_tables(c):
     # Files table
     c.execute('''
         CREATE TABLE IF NOT EXISTS files (
@@ -51,10 +320,382 @@ def init_db():
             FOREIGN KEY (file_id) REFERENCES files (id) ON DELETE CASCADE
         )
     ''')
+
+def _m2_scan_tracking(c):
+    # Scans table: one row per scan_directory run (its id is the scan generation)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            root TEXT NOT NULL,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    
+    # Scan generation that last saw the file, and tombstone for files that vanished
+    _add_column_if_missing(c, "files", "scan_gen", "INTEGER")
+    _add_column_if_missing(c, "files", "missing_since", "TIMESTAMP")
+    
+    # Content hashes: files.hash is the full hash, hash_parcial the quick one
+    # (head + tail + size); hash_firma is "size|modified_at" when they were computed
+    _add_column_if_missing(c, "files", "hash_parcial", "TEXT")
+    _add_column_if_missing(c, "files", "hash_firma", "TEXT")
+    
+    # inode/device let the scanner recognise moved or renamed files
+    _add_column_if_missing(c, "files", "inode", "INTEGER")
+    _add_column_if_missing(c, "files", "device", "INTEGER")
+    
+    # Scan checkpoints, so an interrupted scan can be resumed: batches committed
+    # (NULL for watcher sessions, which can't be resumed), the scan mode, the
+    # highest files.id before the scan, and the directories fully committed
+    _add_column_if_missing(c, "scans", "lotes", "INTEGER")
+    _add_column_if_missing(c, "scans", "incremental", "INTEGER")
+    _add_column_if_missing(c, "scans", "id_max_previo", "INTEGER")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_carpetas (
+            scan_id INTEGER NOT NULL,
+            dir TEXT NOT NULL,
+            PRIMARY KEY (scan_id, dir),
+            FOREIGN KEY (scan_id) REFERENCES scans (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+
+def _m3_gestor_tables(c):
+    # Tables of the interactive managers (gestor.py / gestor_apps.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS apps (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre      TEXT NOT NULL,
+            plataforma  TEXT NOT NULL,
+            categoria   TEXT,
+            version     TEXT,
+            estado      TEXT DEFAULT 'Instalada',
+            es_gratis   INTEGER DEFAULT 1,
+            link_tienda TEXT,
+            notas       TEXT,
+            tags        TEXT,
+            fecha_reg   TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS cuentas_web (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            sitio           TEXT NOT NULL,
+            url             TEXT,
+            categoria       TEXT,
+            email_usuario   TEXT,
+            estado          TEXT DEFAULT 'Activa',
+            plan            TEXT DEFAULT 'Gratuito',
+            tiene_2fa       INTEGER DEFAULT 0,
+            notas           TEXT,
+            tags            TEXT,
+            fecha_reg       TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS paginas_sin_registro (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre      TEXT NOT NULL,
+            url         TEXT NOT NULL,
+            categoria   TEXT,
+            descripcion TEXT,
+            tags        TEXT,
+            fecha_reg   TEXT
+        )
+    ''')
     
-    conn.commit()
+    # Bidirectional relations between records of any table (relaciones.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS notas_relacion (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            origen_tabla  TEXT    NOT NULL,
+            origen_id     INTEGER NOT NULL,
+            descripcion   TEXT    NOT NULL,
+            destino_tabla TEXT    NOT NULL,
+            destino_id    INTEGER NOT NULL,
+            fecha_reg     TEXT
+        )
+    ''')
+
+def _m4_indexes(c):
+    # Per-file lookups (tags of a result row, its descriptions) and tag filters
+    c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_file_key ON metadata (file_id, key)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_metadata_key_value ON metadata (key, value)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_descriptions_file ON descriptions (file_id)")
+    
+    # Common filters and sorts on files; size also drives the duplicate finder
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_extension ON files (extension)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_modified_at ON files (modified_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_resource_type ON files (resource_type)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_size ON files (size)")
+    
+    # Relations are looked up from both ends
+    c.execute("CREATE INDEX IF NOT EXISTS idx_relacion_origen ON notas_relacion (origen_tabla, origen_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_relacion_destino ON notas_relacion (destino_tabla, destino_id)")
+    
+    # Fresh statistics so the planner actually picks the new indexes
+    c.execute("ANALYZE")
+
+# Text of one file as files_fts indexes it: all its descriptions and all its tags
+_FTS_DESCRIPTIONS = "(SELECT group_concat(description, ' ') FROM descriptions WHERE file_id = {id})"
+_FTS_TAGS = "(SELECT group_concat(value, ' ') FROM metadata WHERE file_id = {id} AND key = 'tag')"
+
+def _m5_full_text(c):
+    # One row per file (rowid = files.id). unicode61 splits paths on slashes,
+    # dots, '_' and '-', and remove_diacritics makes "cancion" match "canción".
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+            filename, path, description, tags,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    c.execute(f'''
+        INSERT INTO files_fts (rowid, filename, path, description, tags)
+        SELECT id, filename, path, {_FTS_DESCRIPTIONS.format(id="files.id")}, {_FTS_TAGS.format(id="files.id")}
+        FROM files
+    ''')
+    
+    # Triggers keep it in sync with every writer (scanner, watcher, gestores, MCP tools)
+    # A new files row has no descriptions or tags yet (AUTOINCREMENT never reuses ids)
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+            INSERT INTO files_fts (rowid, filename, path) VALUES (new.id, new.filename, new.path);
+        END
+    ''')
+    # Rescans rewrite every column of unchanged rows; only real renames/moves reindex
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF filename, path ON files
+        WHEN old.filename IS NOT new.filename OR old.path IS NOT new.path BEGIN
+            UPDATE files_fts SET filename = new.filename, path = new.path WHERE rowid = new.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+            DELETE FROM files_fts WHERE rowid = old.id;
+        END
+    ''')
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        row = "old" if event == "DELETE" else "new"
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS descriptions_fts_{event.lower()} AFTER {event} ON descriptions BEGIN
+                UPDATE files_fts SET description = {_FTS_DESCRIPTIONS.format(id=row + ".file_id")}
+                WHERE rowid = {row}.file_id;
+            END
+        ''')
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS metadata_fts_{event.lower()} AFTER {event} ON metadata
+            WHEN {row}.key = 'tag' BEGIN
+                UPDATE files_fts SET tags = {_FTS_TAGS.format(id=row + ".file_id")}
+                WHERE rowid = {row}.file_id;
+            END
+        ''')
+    # A tag renamed to another key, or moved to another file, leaves the old side stale
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS metadata_fts_update_old AFTER UPDATE ON metadata
+        WHEN old.key = 'tag' AND (new.key IS NOT 'tag' OR new.file_id != old.file_id) BEGIN
+            UPDATE files_fts SET tags = {_FTS_TAGS.format(id="old.file_id")}
+            WHERE rowid = old.file_id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS descriptions_fts_update_old AFTER UPDATE OF file_id ON descriptions
+        WHEN new.file_id != old.file_id BEGIN
+            UPDATE files_fts SET description = {_FTS_DESCRIPTIONS.format(id="old.file_id")}
+            WHERE rowid = old.file_id;
+        END
+    ''')
+
+# Rows kept in filename_changes; a reader that fell further behind rebuilds
+FILENAME_CHANGES_KEEP = 100_000
+
+def _m6_filename_changes(c):
+    # Log of renamed and deleted files for in-memory indexes (difuso.py) that
+    # refresh incrementally: new files are simply those with a higher id, so
+    # only changes to existing rows need logging. Trims itself.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS filename_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_log_rename AFTER UPDATE OF filename ON files
+        WHEN old.filename IS NOT new.filename BEGIN
+            INSERT INTO filename_changes (file_id) VALUES (new.id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_log_delete AFTER DELETE ON files BEGIN
+            INSERT INTO filename_changes (file_id) VALUES (old.id);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS filename_changes_trim AFTER INSERT ON filename_changes BEGIN
+            DELETE FROM filename_changes WHERE seq <= new.seq - {FILENAME_CHANGES_KEEP};
+        END
+    ''')
+
+def _m7_log_tombstones(c):
+    # Files that go missing (or come back) leave search results like a delete
+    # (or an insert) would, so in-memory indexes need to hear about them too
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_log_tombstone AFTER UPDATE OF missing_since ON files
+        WHEN (old.missing_since IS NULL) IS NOT (new.missing_since IS NULL) BEGIN
+            INSERT INTO filename_changes (file_id) VALUES (new.id);
+        END
+    ''')
+
+MIGRATIONS = [
+    (1, "base tables", _m1_base_tables),
+    (2, "scan generations, tombstones, hashes, inodes and checkpoints", _m2_scan_tracking),
+    (3, "gestor and relaciones tables", _m3_gestor_tables),
+    (4, "secondary indexes", _m4_indexes),
+    (5, "full-text index over names, paths, descriptions and tags", _m5_full_text),
+    (6, "renamed/deleted files log for incremental in-memory indexes", _m6_filename_changes),
+    (7, "log files that go missing or come back", _m7_log_tombstones),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def ensure_schema(conn):
+    """Applies pending migrations in place. Safe (and cheap) to call on every start."""
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return
+    c = conn.cursor()
+    # IMMEDIATE takes the write lock first, so two processes starting at the same
+    # time don't both migrate; the version is re-read inside the transaction
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)
+        for version, _description, migrate in MIGRATIONS:
+            if version > current:
+                migrate(c)
+                c.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# ORDER BY for files_fts matches: a hit in the name outweighs one in the tags,
+# the description or (last) somewhere in the folder path
+FTS_RANK = "bm25(files_fts, 10.0, 1.0, 4.0, 6.0)"
+
+def fts_match(text, columns=None):
+    """Turns what a user typed into an FTS5 MATCH expression: every word must
+    appear, as a prefix, in one of `columns` (all columns by default).
+    Returns None when the text has no words to search for."""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    expr = " AND ".join(f'"{w}"*' for w in words)
+    if columns:
+        expr = "{%s} : (%s)" % (" ".join(columns), expr)
+    return expr
+
+def fts_filter(text, columns, id_column="f.id", exclude=False):
+    """WHERE condition and its parameter keeping the files whose `columns` match
+    `text` (exclude=True keeps the others). (None, None) if there is nothing to match."""
+    expr = fts_match(text, columns)
+    if expr is None:
+        return None, None
+    op = "NOT IN" if exclude else "IN"
+    return f"{id_column} {op} (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)", expr
+
+# ─────────────────────────────────────────────────────────────────────────────
+# OPTIONAL TRIGRAM INDEX
+# Substring filters (path LIKE '%reporte%') can't use a B-tree or files_fts,
+# which only matches whole words/prefixes. files_path_tri indexes every
+# 3-character run of files.path, so those filters become index lookups.
+# It is opt-in (python database.py --trigram-index on) because it makes scans
+# slower and the database bigger. It is an external-content table: it reads
+# the paths from files instead of storing a second copy, and SQLite re-checks
+# each candidate with the real LIKE, so results are exactly those of LIKE.
+# ─────────────────────────────────────────────────────────────────────────────
+
+TRIGRAM_MIN_CHARS = 3
+
+def trigram_index_enabled(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_path_tri'"
+    ).fetchone() is not None
+
+def enable_trigram_index(conn):
+    """Creates and fills files_path_tri plus the triggers that keep it in sync."""
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_path_tri USING fts5(
+                path, content = 'files', content_rowid = 'id', tokenize = 'trigram'
+            )
+        ''')
+        c.execute("INSERT INTO files_path_tri (files_path_tri) VALUES ('rebuild')")
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_tri_insert AFTER INSERT ON files BEGIN
+                INSERT INTO files_path_tri (rowid, path) VALUES (new.id, new.path);
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_tri_update AFTER UPDATE OF path ON files
+            WHEN old.path IS NOT new.path BEGIN
+                INSERT INTO files_path_tri (files_path_tri, rowid, path) VALUES ('delete', old.id, old.path);
+                INSERT INTO files_path_tri (rowid, path) VALUES (new.id, new.path);
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_tri_delete AFTER DELETE ON files BEGIN
+                INSERT INTO files_path_tri (files_path_tri, rowid, path) VALUES ('delete', old.id, old.path);
+            END
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def disable_trigram_index(conn):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        for trigger in ("files_tri_insert", "files_tri_update", "files_tri_delete"):
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        c.execute("DROP TABLE IF EXISTS files_path_tri")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def path_like_filter(conn, text, exclude=False, path_column="f.path", id_column="f.id"):
+    """WHERE condition and its parameter equivalent to `path [NOT] LIKE '%text%'`.
+    Goes through the trigram index when it is enabled and the text is long enough
+    for it (at least 3 characters); otherwise it is the plain LIKE."""
+    pattern = f"%{text}%"
+    if len(text) < TRIGRAM_MIN_CHARS or not trigram_index_enabled(conn):
+        return f"{path_column} {'NOT LIKE' if exclude else 'LIKE'} ?", pattern
+    op = "NOT IN" if exclude else "IN"
+    return f"{id_column} {op} (SELECT rowid FROM files_path_tri WHERE path LIKE ?)", pattern
+
+def init_db():
+    conn = get_db_connection()
+    ensure_schema(conn)
     conn.close()
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Create or upgrade files.db")
+    parser.add_argument("--trigram-index", choices=["on", "off"],
+                        help="Enable or drop the optional trigram index for substring path searches")
+    args = parser.parse_args()
+    
     init_db()
-    print(f"Database initialized at {DB_PATH}")
+    print(f"Database initialized at {DB_PATH} (schema version {SCHEMA_VERSION})")
+    if args.trigram_index:
+        conn = get_db_connection()
+        if args.trigram_index == "on":
+            enable_trigram_index(conn)
+            print("Trigram index enabled.")
+        else:
+            disable_trigram_index(conn)
+            print("Trigram index dropped.")
+        conn.close()
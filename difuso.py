@@ -0,0 +1,275 @@
+"""
+difuso.py
+─────────
+Búsqueda de archivos por nombre tolerante a errores de tipeo ("reprote" →
+"reporte_2023.pdf").
+
+IndiceDifuso guarda en memoria las palabras de los nombres de archivo ya
+normalizadas (minúsculas, sin tildes, partidas en letras/números) y dos
+listas invertidas:
+
+    trigrama → palabras que lo contienen   (para encontrar candidatas rápido)
+    palabra  → archivos que la contienen
+
+Para cada palabra buscada se toman las palabras del índice que comparten más
+trigramas con ella y solo a esas se les calcula la distancia de edición
+(Damerau restringida: una transposición cuenta como un error). Una palabra
+también puede coincidir como prefijo ("infrom" → "informe_final"). Los
+números (años, versiones) solo coinciden exactos.
+
+El índice se construye la primera vez que se usa y después se actualiza por
+partes: los archivos nuevos son los de id mayor al último visto, y los
+renombrados o borrados se leen de la tabla filename_changes, que llenan
+triggers de la BD (también cuando un archivo se marca como desaparecido o
+vuelve a aparecer). Los archivos con missing_since no se indexan. Si el índice
+quedó tan atrás que esa tabla ya se recortó, se reconstruye entero.
+"""
+
+import re
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+
+# Palabras del índice a las que se les calcula la distancia, por palabra buscada
+CANDIDATOS = 300
+
+# Las coincidencias por prefijo valen un poco menos que la palabra completa
+PESO_PREFIJO = 0.9
+
+
+def normalizar(texto: str) -> list:
+    """'Canción_Final v2.MP3' → ['cancion', 'final', 'v2', 'mp3']"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(ch for ch in texto if not unicodedata.combining(ch))
+    return re.findall(r"[^\W_]+", texto)
+
+
+def _trigramas(palabra: str) -> set:
+    p = f"${palabra}$"
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def errores_permitidos(palabra: str) -> int:
+    """Errores de tipeo tolerados según el largo de la palabra buscada."""
+    if palabra.isdigit() or len(palabra) <= 2:
+        return 0
+    if len(palabra) <= 5:
+        return 1
+    return 2 if len(palabra) <= 9 else 3
+
+
+def distancia(a: str, b: str, tope: int) -> int:
+    """Distancia de edición con transposiciones (OSA). Devuelve tope + 1 en cuanto
+    sabe que se pasa del tope, sin terminar la tabla."""
+    if abs(len(a) - len(b)) > tope:
+        return tope + 1
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        fila = [i] + [0] * len(b)
+        minimo = i
+        for j in range(1, len(b) + 1):
+            cb = b[j - 1]
+            v = min(anterior[j] + 1, fila[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                v = min(v, anterior2[j - 2] + 1)
+            fila[j] = v
+            if v < minimo:
+                minimo = v
+        if minimo > tope:
+            return tope + 1
+        anterior2, anterior = anterior, fila
+    return anterior[-1]
+
+
+class IndiceDifuso:
+    """Índice en memoria de los nombres de archivo. Seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.construido = False
+        self._vaciar()
+
+    def _vaciar(self):
+        self._ids_palabra = {}          # palabra → id de palabra
+        self._palabras = []             # id de palabra → palabra
+        self._por_trigrama = {}         # trigrama → [ids de palabra]
+        self._archivos = []             # id de palabra → file_id | {file_id} | None
+        self._de_archivo = {}           # file_id → (ids de palabra,)
+        self.ultimo_id = 0              # mayor files.id indexado
+        self.ultimo_cambio = 0          # mayor filename_changes.seq aplicado
+
+    # ─── Mantenimiento ────────────────────────────────────────────────────────
+
+    def _id_palabra(self, palabra: str) -> int:
+        wid = self._ids_palabra.get(palabra)
+        if wid is None:
+            wid = len(self._palabras)
+            self._ids_palabra[palabra] = wid
+            self._palabras.append(palabra)
+            self._archivos.append(None)
+            # Los números solo se buscan exactos: sin trigramas
+            if not palabra.isdigit():
+                for t in _trigramas(palabra):
+                    self._por_trigrama.setdefault(t, []).append(wid)
+        return wid
+
+    # Muchas palabras (números, códigos) aparecen en un solo archivo: para esas se
+    # guarda el file_id suelto en vez de un set, que ocupa diez veces más
+
+    def _agregar(self, file_id: int, nombre: str):
+        ids = tuple({self._id_palabra(p) for p in normalizar(nombre)})
+        self._de_archivo[file_id] = ids
+        for wid in ids:
+            actual = self._archivos[wid]
+            if actual is None:
+                self._archivos[wid] = file_id
+            elif isinstance(actual, set):
+                actual.add(file_id)
+            elif actual != file_id:
+                self._archivos[wid] = {actual, file_id}
+
+    def _quitar(self, file_id: int):
+        for wid in self._de_archivo.pop(file_id, ()):
+            actual = self._archivos[wid]
+            if isinstance(actual, set):
+                actual.discard(file_id)
+            elif actual == file_id:
+                self._archivos[wid] = None
+
+    def _archivos_de(self, wid: int) -> set:
+        actual = self._archivos[wid]
+        if isinstance(actual, set):
+            return actual
+        return set() if actual is None else {actual}
+
+    def _construir(self, conn):
+        self._vaciar()
+        # El seq se lee antes que las filas: un cambio que caiga en medio se
+        # vuelve a aplicar en la próxima actualización, y aplicarlo es idempotente
+        self.ultimo_cambio = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM filename_changes").fetchone()[0]
+        for file_id, nombre, desaparecido in conn.execute("SELECT id, filename, missing_since FROM files"):
+            if desaparecido is None:
+                self._agregar(file_id, nombre)
+            if file_id > self.ultimo_id:
+                self.ultimo_id = file_id
+        self.construido = True
+
+    def actualizar(self, conn) -> int:
+        """Pone el índice al día con la BD. Devuelve cuántos archivos revisó."""
+        with self._lock:
+            if not self.construido:
+                self._construir(conn)
+                return len(self._de_archivo)
+            cambios = conn.execute(
+                "SELECT seq, file_id FROM filename_changes WHERE seq > ? ORDER BY seq",
+                (self.ultimo_cambio,)
+            ).fetchall()
+            if cambios and cambios[0][0] > self.ultimo_cambio + 1:
+                # filename_changes se recortó con cambios que no vimos
+                self._construir(conn)
+                return len(self._de_archivo)
+            revisados = 0
+            if cambios:
+                ids = list({fid for _, fid in cambios})
+                for fid in ids:
+                    self._quitar(fid)
+                for i in range(0, len(ids), 500):
+                    lote = ids[i:i + 500]
+                    filas = conn.execute(
+                        f"SELECT id, filename FROM files WHERE id IN ({','.join('?' * len(lote))}) "
+                        "AND missing_since IS NULL", lote
+                    )
+                    for file_id, nombre in filas:
+                        self._agregar(file_id, nombre)
+                self.ultimo_cambio = cambios[-1][0]
+                revisados += len(ids)
+            for file_id, nombre, desaparecido in conn.execute(
+                "SELECT id, filename, missing_since FROM files WHERE id > ?", (self.ultimo_id,)
+            ):
+                if desaparecido is None:
+                    self._agregar(file_id, nombre)
+                self.ultimo_id = max(self.ultimo_id, file_id)
+                revisados += 1
+            return revisados
+
+    # ─── Búsqueda ─────────────────────────────────────────────────────────────
+
+    def _parecidas(self, q: str) -> dict:
+        """{id de palabra: (similitud 0..1, errores)} de las palabras del índice
+        que coinciden con q, completa o como prefijo, dentro del tope de errores."""
+        tope = errores_permitidos(q)
+        if q.isdigit():
+            candidatas = [self._ids_palabra[q]] if q in self._ids_palabra else []
+        else:
+            cuenta = Counter()
+            for t in _trigramas(q):
+                cuenta.update(self._por_trigrama.get(t, ()))
+            candidatas = [wid for wid, _ in cuenta.most_common(CANDIDATOS)]
+            if q in self._ids_palabra:
+                candidatas.append(self._ids_palabra[q])
+
+        resultado = {}
+        for wid in candidatas:
+            if not self._archivos[wid]:
+                continue
+            p = self._palabras[wid]
+            d = distancia(q, p, tope)
+            similitud = 1 - d / max(len(q), len(p)) if d <= tope else 0.0
+            errores = d
+            if len(p) > len(q):
+                dp = distancia(q, p[:len(q)], tope)
+                if dp <= tope and (1 - dp / len(q)) * PESO_PREFIJO > similitud:
+                    similitud, errores = (1 - dp / len(q)) * PESO_PREFIJO, dp
+            if similitud > 0:
+                resultado[wid] = (similitud, errores)
+        return resultado
+
+    def buscar(self, texto: str, limite: int = 10) -> list:
+        """[(file_id, puntaje 0..1, errores)] de los archivos cuyo nombre contiene
+        todas las palabras de texto (cada una con errores tolerados), mejores primero."""
+        consulta = list(dict.fromkeys(normalizar(texto)))
+        if not consulta or limite < 1:
+            return []
+        with self._lock:
+            # Por palabra buscada: sus parecidas de mejor a peor (similitud, errores)
+            listas = []
+            for q in consulta:
+                parecidas = self._parecidas(q)
+                if not parecidas:
+                    return []
+                listas.append(sorted(
+                    ((sim, err, self._archivos_de(wid)) for wid, (sim, err) in parecidas.items()),
+                    key=lambda x: (-x[0], x[1])
+                ))
+            # Archivos que tienen algo parecido a cada una de las palabras buscadas
+            universo = set().union(*(a for _, _, a in listas[0]))
+            for lista in listas[1:]:
+                universo &= set().union(*(a for _, _, a in lista))
+                if not universo:
+                    return []
+
+            # Combinaciones (una parecida por palabra buscada) de mejor a peor puntaje.
+            # Un archivo aparece primero en su mejor combinación, y ese es su puntaje.
+            def clave(idx):
+                sim = sum(listas[k][i][0] for k, i in enumerate(idx)) / len(listas)
+                err = sum(listas[k][i][1] for k, i in enumerate(idx))
+                return (-sim, err)
+
+            inicio = (0,) * len(listas)
+            pendientes, vistas = [(clave(inicio), inicio)], {inicio}
+            resultado, dados = [], set()
+            while pendientes and len(resultado) < limite and len(dados) < len(universo):
+                (neg_sim, err), idx = heapq.heappop(pendientes)
+                nuevos = universo.intersection(*(listas[k][i][2] for k, i in enumerate(idx))) - dados
+                dados |= nuevos
+                for fid in heapq.nlargest(limite - len(resultado), nuevos):
+                    resultado.append((fid, round(-neg_sim, 3), err))
+                for k in range(len(idx)):
+                    if idx[k] + 1 < len(listas[k]):
+                        sig = idx[:k] + (idx[k] + 1,) + idx[k + 1:]
+                        if sig not in vistas:
+                            vistas.add(sig)
+                            heapq.heappush(pendientes, (clave(sig), sig))
+        return resultado
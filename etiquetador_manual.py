@@ -1,5 +1,5 @@
-import sqlite3
 import os
+from database import get_db_connection, ensure_schema, fts_match, FTS_RANK
 
 db_path = os.path.join(os.path.dirname(__file__), "files.db")
 
@@ -9,11 +9,18 @@ def agregar_metadata_manual():
     # 1. Buscar el archivo primero
     busqueda = input("\nIntroduce parte del nombre del archivo a buscar: ")
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = get_db_connection(db_path)
+    ensure_schema(conn)
     c = conn.cursor()
     
-    c.execute("SELECT id, filename, path FROM files WHERE filename LIKE ?", (f"%{busqueda}%",))
+    # Por palabras del nombre (sin tildes, por prefijo), las mejores primero;
+    # los archivos desaparecidos (missing_since) no se ofrecen
+    fts = fts_match(busqueda, ["filename"])
+    if fts:
+        c.execute(f"""SELECT f.id, f.filename, f.path FROM files_fts JOIN files f ON f.id = files_fts.rowid
+                      WHERE files_fts MATCH ? AND f.missing_since IS NULL ORDER BY {FTS_RANK}""", (fts,))
+    else:
+        c.execute("SELECT id, filename, path FROM files WHERE filename LIKE ? AND missing_since IS NULL", (f"%{busqueda}%",))
     resultados = c.fetchall()
     
     if not resultados:
@@ -0,0 +1,227 @@
+"""
+exclusiones.py
+──────────────
+Reglas de exclusión del escáner, estilo .gitignore.
+
+Las reglas base (las de siempre: archivos de sistema, ocultos y carpetas que
+empiezan por '.', '$' o '~') se combinan con las del archivo REGLAS_PATH
+(exclusiones.txt), que admite:
+
+    node_modules/      carpeta con ese nombre en cualquier nivel (se poda)
+    *.iso              patrón glob sobre el nombre
+    /Descargas/tmp/    anclada a la raíz escaneada (lleva '/' al inicio o en medio)
+    **/build/          '**' cruza cualquier número de carpetas
+    !importante.log    '!' vuelve a incluir algo excluido por una regla anterior
+    # comentario
+
+Como en git, gana la última regla que coincide, y todas se comparan sin
+distinguir mayúsculas. Las reglas se compilan una sola vez: los nombres
+exactos y las extensiones van a diccionarios y los prefijos a startswith;
+solo los globs más complejos pasan por una expresión regular. Las reglas de
+carpeta se aplican al recorrer, así que un node_modules nunca se visita.
+Cada regla cuenta sus aciertos para el resumen del escaneo.
+"""
+
+import os
+import re
+import threading
+
+# ─────────────────────────────────────────────────────────────────────────────
+# REGLAS BASE
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Extensiones de archivos de sistema/basura que se ignoran siempre
+EXTENSIONES_IGNORADAS = {
+    '.ini', '.tmp', '.temp', '.lnk', '.sys', '.dll', '.log',
+    '.ds_store', '.thumbs', '.bak',
+}
+
+# Nombres de archivo exactos que se ignoran siempre (en minúsculas)
+NOMBRES_IGNORADOS = {
+    'desktop.ini', 'thumbs.db', '.ds_store', 'ntuser.dat',
+    'ntuser.ini', 'ntuser.pol',
+}
+
+# Prefijos de carpeta que se saltan (ocultas o de sistema)
+CARPETAS_SKIP_PREFIJOS = ('.', '$', '~')
+
+# Prefijos de archivos ocultos de Windows/Linux
+ARCHIVOS_OCULTOS_PREFIJOS = ('.', '~')
+
+# Archivo de reglas del usuario (opcional)
+REGLAS_PATH = os.path.join(os.path.dirname(__file__), "exclusiones.txt")
+
+
+def _reglas_base() -> list:
+    """Las reglas de siempre, como texto. Las de archivo no aplican a carpetas."""
+    reglas  = [(n, "archivo") for n in sorted(NOMBRES_IGNORADOS)]
+    reglas += [(f"*{e}", "archivo") for e in sorted(EXTENSIONES_IGNORADAS)]
+    reglas += [(f"{p}*", "archivo") for p in ARCHIVOS_OCULTOS_PREFIJOS]
+    reglas += [(f"{p}*/", None) for p in CARPETAS_SKIP_PREFIJOS]
+    return reglas
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMPILACIÓN
+# ─────────────────────────────────────────────────────────────────────────────
+
+_COMODINES = set("*?[")
+
+
+def _glob_a_regex(patron: str):
+    """Traduce un glob estilo gitignore ('*' no cruza '/', '**' sí) a regex."""
+    partes, i = [], 0
+    while i < len(patron):
+        if patron.startswith("**/", i):
+            partes.append("(?:.*/)?")
+            i += 3
+        elif patron.startswith("**", i):
+            partes.append(".*")
+            i += 2
+        elif patron[i] == "*":
+            partes.append("[^/]*")
+            i += 1
+        elif patron[i] == "?":
+            partes.append("[^/]")
+            i += 1
+        elif patron[i] == "[":
+            fin = patron.find("]", i + 1)
+            if fin == -1:
+                partes.append(re.escape("["))
+                i += 1
+            else:
+                clase = patron[i + 1:fin]
+                if clase.startswith("!"):
+                    clase = "^" + clase[1:]
+                partes.append("[" + clase.replace("\\", "\\\\") + "]")
+                i = fin + 1
+        else:
+            partes.append(re.escape(patron[i]))
+            i += 1
+    return re.compile("".join(partes))
+
+
+class Regla:
+    """Una línea del archivo de reglas, ya interpretada."""
+
+    def __init__(self, texto: str, ambito: str = None):
+        self.texto   = texto
+        self.aciertos = 0
+        patron = texto.strip()
+        self.negada = patron.startswith("!")
+        if self.negada:
+            patron = patron[1:]
+        # ambito: 'carpeta' (acaba en '/'), 'archivo' (solo reglas base) o None (ambos)
+        self.ambito = ambito
+        if patron.endswith("/"):
+            self.ambito = "carpeta"
+            patron = patron.rstrip("/")
+        # Con '/' al inicio o en medio, se compara con la ruta relativa a la raíz
+        self.anclada = "/" in patron
+        self.patron  = patron.lstrip("/").lower()
+
+        p = self.patron
+        if self.anclada or "**" in p:
+            self.tipo, self.valor = "regex", _glob_a_regex(p)
+        elif not _COMODINES & set(p):
+            self.tipo, self.valor = "nombre", p
+        elif p.startswith("*.") and not _COMODINES & set(p[2:]) and "." not in p[2:]:
+            self.tipo, self.valor = "ext", p[1:]
+        elif p.endswith("*") and not _COMODINES & set(p[:-1]):
+            self.tipo, self.valor = "prefijo", p[:-1]
+        else:
+            self.tipo, self.valor = "regex", _glob_a_regex(p)
+
+    def coincide(self, nombre: str, rel: str) -> bool:
+        """Solo para reglas 'prefijo' y 'regex' (las otras van por diccionario)."""
+        if self.tipo == "prefijo":
+            return nombre.startswith(self.valor)
+        objetivo = rel if self.anclada else nombre
+        return objetivo is not None and self.valor.fullmatch(objetivo) is not None
+
+
+class Exclusiones:
+    """Conjunto compilado de reglas con contadores de aciertos."""
+
+    def __init__(self, reglas: list):
+        self.reglas = reglas
+        self._lock  = threading.Lock()
+        # Por ámbito ('archivo' / 'carpeta'): índices rápidos → posición de la regla
+        self._nombres = {"archivo": {}, "carpeta": {}}
+        self._exts    = {"archivo": {}, "carpeta": {}}
+        self._resto   = {"archivo": [], "carpeta": []}
+        for idx, regla in enumerate(reglas):
+            ambitos = [regla.ambito] if regla.ambito else ["archivo", "carpeta"]
+            for amb in ambitos:
+                if regla.tipo == "nombre":
+                    self._nombres[amb][regla.valor] = idx
+                elif regla.tipo == "ext":
+                    self._exts[amb][regla.valor] = idx
+                else:
+                    self._resto[amb].append((idx, regla))
+        # El resto se revisa de la última a la primera: gana la última que coincide
+        for amb in self._resto:
+            self._resto[amb].reverse()
+        # Solo hace falta calcular rutas relativas si hay reglas ancladas
+        self.usa_rutas = any(r.anclada for r in reglas)
+
+    def _regla_ganadora(self, ambito: str, nombre: str, rel: str):
+        nombre = nombre.lower()
+        mejor = self._nombres[ambito].get(nombre, -1)
+        punto = nombre.rfind(".")
+        if punto > 0:
+            mejor = max(mejor, self._exts[ambito].get(nombre[punto:], -1))
+        if rel is not None:
+            rel = rel.replace(os.sep, "/").lower()
+        for idx, regla in self._resto[ambito]:
+            if idx <= mejor:
+                break
+            if regla.coincide(nombre, rel):
+                mejor = idx
+                break
+        return self.reglas[mejor] if mejor >= 0 else None
+
+    def _excluye(self, ambito: str, nombre: str, rel: str) -> bool:
+        regla = self._regla_ganadora(ambito, nombre, rel)
+        if regla is None or regla.negada:
+            return False
+        with self._lock:
+            regla.aciertos += 1
+        return True
+
+    def excluye_archivo(self, nombre: str, rel: str = None) -> bool:
+        """rel: ruta relativa a la raíz escaneada (solo la usan las reglas ancladas)."""
+        return self._excluye("archivo", nombre, rel)
+
+    def excluye_carpeta(self, nombre: str, rel: str = None) -> bool:
+        return self._excluye("carpeta", nombre, rel)
+
+    def excluye_ruta(self, rel: str) -> bool:
+        """Si el escáner excluiría el archivo de la ruta rel (relativa a la raíz
+        escaneada), por él mismo o por alguna de sus carpetas. No suma aciertos."""
+        partes = rel.replace(os.sep, "/").split("/")
+        for i, nombre in enumerate(partes):
+            ambito = "archivo" if i == len(partes) - 1 else "carpeta"
+            regla = self._regla_ganadora(ambito, nombre, "/".join(partes[:i + 1]))
+            if regla is not None and not regla.negada:
+                return True
+        return False
+
+    def resumen(self) -> list:
+        """[(texto de la regla, aciertos)] de las reglas que excluyeron algo."""
+        return sorted(
+            ((r.texto, r.aciertos) for r in self.reglas if r.aciertos),
+            key=lambda x: x[1], reverse=True
+        )
+
+
+def cargar_exclusiones(ruta: str = REGLAS_PATH) -> Exclusiones:
+    """Reglas base + las del archivo de reglas (si existe), compiladas."""
+    reglas = [Regla(texto, ambito) for texto, ambito in _reglas_base()]
+    if ruta and os.path.exists(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.strip()
+                if linea and not linea.startswith("#"):
+                    reglas.append(Regla(linea))
+    return Exclusiones(reglas)
@@ -1,9 +1,9 @@
-import sqlite3
 import os
 import sys
 import json
 import math
 import msvcrt
+import sqlite3
 import datetime
 import zipfile
 import webbrowser
@@ -26,16 +26,15 @@ CACHE_DBX  = os.path.join(BASE_DIR, "cache_dropbox.json")
 
 # ── Importaciones locales ─────────────────────────────────────────────────────
 from scanner import scan_directory
-from relaciones import init_relaciones, mostrar_relaciones, menu_relaciones
+from database import ensure_schema, get_db_connection, backup_db, fts_filter, path_like_filter
+from relaciones import mostrar_relaciones, menu_relaciones
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  HELPERS GLOBALES
 # ══════════════════════════════════════════════════════════════════════════════
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_db_connection(DB_PATH)
 
 def sep(c="─", n=70):
     print(c * n)
@@ -117,45 +116,9 @@ def get_all_tags(conn):
 # ══════════════════════════════════════════════════════════════════════════════
 
 def init_tablas(conn):
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS apps (
-            id          INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre      TEXT NOT NULL,
-            plataforma  TEXT NOT NULL,
-            categoria   TEXT,
-            version     TEXT,
-            estado      TEXT DEFAULT 'Instalada',
-            es_gratis   INTEGER DEFAULT 1,
-            link_tienda TEXT,
-            notas       TEXT,
-            tags        TEXT,
-            fecha_reg   TEXT
-        );
-        CREATE TABLE IF NOT EXISTS cuentas_web (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            sitio           TEXT NOT NULL,
-            url             TEXT,
-            categoria       TEXT,
-            email_usuario   TEXT,
-            estado          TEXT DEFAULT 'Activa',
-            plan            TEXT DEFAULT 'Gratuito',
-            tiene_2fa       INTEGER DEFAULT 0,
-            notas           TEXT,
-            tags            TEXT,
-            fecha_reg       TEXT
-        );
-        CREATE TABLE IF NOT EXISTS paginas_sin_registro (
-            id          INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre      TEXT NOT NULL,
-            url         TEXT NOT NULL,
-            categoria   TEXT,
-            descripcion TEXT,
-            tags        TEXT,
-            fecha_reg   TEXT
-        );
-    """)
-    conn.commit()
-    init_relaciones(conn)
+    # Todas las tablas (archivos, apps, cuentas, páginas y relaciones) e índices
+    # se crean y migran en database.ensure_schema, versionadas con user_version
+    ensure_schema(conn)
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  CONSTANTES
@@ -232,14 +195,24 @@ def agregar_archivo_pc(conn):
             print("❌ No hay 'respuestas.txt' todavía. Créalo y vuelve a intentarlo.")
             return
         c = conn.cursor()
+        importadas, omitidas = 0, []
         with open(resp, "r", encoding="utf-8") as f:
-            for line in f:
-                if '|' in line:
-                    fid, tags = line.strip().split('|', 1)
-                    for t in tags.split(','):
-                        c.execute("INSERT INTO metadata (file_id, key, value) VALUES (?, 'tag', ?)", (fid.strip(), t.strip().lower()))
+            for n, line in enumerate(f, 1):
+                if '|' not in line:
+                    continue
+                fid, tags = line.strip().split('|', 1)
+                # Un ID que ya no está en files (p. ej. purgado desde la
+                # exportación) viola la clave foránea; se omite esa línea
+                try:
+                    c.executemany("INSERT INTO metadata (file_id, key, value) VALUES (?, 'tag', ?)",
+                                  [(fid.strip(), t.strip().lower()) for t in tags.split(',')])
+                    importadas += 1
+                except sqlite3.IntegrityError:
+                    omitidas.append(n)
         conn.commit()
-        print("✅ Importado correctamente.")
+        print(f"✅ Importado correctamente ({importadas} líneas).")
+        if omitidas:
+            print(f"⚠️  {len(omitidas)} líneas omitidas por ID inexistente: {', '.join(map(str, omitidas))}")
 
 def agregar_enlace_web_archivo(conn):
     url    = input("\n🌐 URL: ").strip()
@@ -431,6 +404,7 @@ def stats_archivos_pc(conn):
     total     = c.execute("SELECT count(*) FROM files").fetchone()[0]
     locales   = c.execute("SELECT count(*) FROM files WHERE resource_type='local'").fetchone()[0]
     webs      = c.execute("SELECT count(*) FROM files WHERE resource_type='web'").fetchone()[0]
+    ausentes  = c.execute("SELECT count(*) FROM files WHERE missing_since IS NOT NULL").fetchone()[0]
     sin_desc  = c.execute("SELECT count(*) FROM files WHERE id NOT IN (SELECT file_id FROM descriptions)").fetchone()[0]
     sin_tags  = c.execute("SELECT count(*) FROM files WHERE id NOT IN (SELECT file_id FROM metadata WHERE key='tag')").fetchone()[0]
     n_tags    = c.execute("SELECT count(DISTINCT value) FROM metadata WHERE key='tag'").fetchone()[0]
@@ -438,11 +412,32 @@ def stats_archivos_pc(conn):
     print(f"  Total registros     : {total}")
     print(f"  Archivos locales    : {locales}")
     print(f"  Links/webs          : {webs}")
+    print(f"  Ya no existen       : {ausentes}")
     print(f"  Tags únicas         : {n_tags}")
     print(f"  Sin descripción     : {sin_desc}")
     print(f"  Sin etiquetas       : {sin_tags}")
     sep("=")
 
+def stats_duplicados(conn):
+    from hashes import buscar_duplicados
+    sep("="); print("🧬 ARCHIVOS DUPLICADOS"); sep("=")
+    print("  ⏳ Agrupando por tamaño y hasheando solo las coincidencias...")
+    grupos = buscar_duplicados(conn)
+    if not grupos:
+        print("  ✅ No hay archivos duplicados.")
+        sep("="); return
+    total = sum(g['desperdicio'] for g in grupos)
+    print(f"  Grupos duplicados   : {len(grupos)}")
+    print(f"  Espacio desperdiciado: {total / 1024 / 1024:.1f} MB")
+    sep()
+    for g in grupos[:20]:
+        print(f"  {len(g['paths'])} copias · {g['size'] / 1024:.1f} KB · desperdicio {g['desperdicio'] / 1024:.1f} KB")
+        for p in g['paths']:
+            print(f"     {p}")
+    if len(grupos) > 20:
+        print(f"  … y {len(grupos) - 20} grupos más.")
+    sep("=")
+
 def stats_nubes():
     caches = [
         ("YouTube",  CACHE_YT),
@@ -528,18 +523,20 @@ def menu_estadisticas(conn):
         print("4. 🔑  Cuentas web")
         print("5. 🔖  Páginas sin registro")
         print("6. 🌍  Vista Global")
+        print("7. 🧬  Archivos duplicados")
         print("─"*60)
-        print("7. 🔙  Volver al menú anterior")
+        print("8. 🔙  Volver al menú anterior")
         print("0. 🏠  Menú principal")
         print("═"*60)
-        opc = input("Elige (0-7): ").strip()
+        opc = input("Elige (0-8): ").strip()
         if   opc == '1': stats_archivos_pc(conn)
         elif opc == '2': stats_nubes()
         elif opc == '3': stats_apps(conn)
         elif opc == '4': stats_cuentas(conn)
         elif opc == '5': stats_paginas(conn)
         elif opc == '6': stats_global(conn)
-        elif opc in ('7', 'q'): break
+        elif opc == '7': stats_duplicados(conn)
+        elif opc in ('8', 'q'): break
         elif opc == '0': return VOLVER_PRINCIPAL
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -606,11 +603,13 @@ def buscar_archivos_pc(conn):
     tipos_inc = _parse_exts(tipo_raw)
     tipos_exc = _parse_exts(excluir_tipo_raw)
 
-    q = "SELECT f.id, f.filename, f.path, f.resource_type, f.modified_at, d.description FROM files f LEFT JOIN descriptions d ON f.id=d.file_id WHERE 1=1"
+    q = "SELECT f.id, f.filename, f.path, f.resource_type, f.modified_at, d.description FROM files f LEFT JOIN descriptions d ON f.id=d.file_id WHERE f.missing_since IS NULL"
     params = []
     # Inclusivos
-    if ubicacion: q += " AND f.path LIKE ?"; params.append(f"%{ubicacion}%")
-    if tag:       q += " AND f.id IN (SELECT file_id FROM metadata WHERE key='tag' AND value LIKE ?)"; params.append(f"%{tag}%")
+    if ubicacion:
+        cond, patron = path_like_filter(conn, ubicacion); q += f" AND {cond}"; params.append(patron)
+    cond, fts = fts_filter(tag, ["tags"])
+    if cond:      q += f" AND {cond}"; params.append(fts)
     if dias.isdigit(): q += f" AND f.modified_at >= datetime('now','-{dias} days')"
     if tipos_inc:
         if tipos_inc == ['__web__']:
@@ -625,8 +624,10 @@ def buscar_archivos_pc(conn):
             q += f" AND lower(f.extension) IN ({ph})"
             params.extend(tipos_inc)
     # Exclusivos
-    if excluir_ubic: q += " AND f.path NOT LIKE ?"; params.append(f"%{excluir_ubic}%")
-    if excluir_tag:  q += " AND f.id NOT IN (SELECT file_id FROM metadata WHERE key='tag' AND value LIKE ?)"; params.append(f"%{excluir_tag}%")
+    if excluir_ubic:
+        cond, patron = path_like_filter(conn, excluir_ubic, exclude=True); q += f" AND {cond}"; params.append(patron)
+    cond, fts = fts_filter(excluir_tag, ["tags"], exclude=True)
+    if cond:         q += f" AND {cond}"; params.append(fts)
     if tipos_exc:
         if tipos_exc == ['__web__']:
             q += " AND f.resource_type != 'web'"
@@ -1165,12 +1166,18 @@ def crear_respaldo():
     os.makedirs(backup_dir, exist_ok=True)
     fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     ruta  = os.path.join(backup_dir, f"respaldo_{fecha}.zip")
+    copia = ruta + ".db"
     try:
+        # Copia consistente con backup_db (incluye lo que aún está en el WAL)
+        backup_db(copia, DB_PATH)
         with zipfile.ZipFile(ruta, 'w', zipfile.ZIP_DEFLATED) as z:
-            z.write(DB_PATH, "files.db")
+            z.write(copia, "files.db")
         print(f"✅ Respaldo creado: {ruta}")
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        if os.path.exists(copia):
+            os.remove(copia)
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  MENÚ PRINCIPAL
@@ -1,9 +1,9 @@
-import sqlite3
 import os
 import sys
 import webbrowser
 import datetime
-from relaciones import init_relaciones, mostrar_relaciones, menu_relaciones
+from relaciones import mostrar_relaciones, menu_relaciones
+from database import ensure_schema, get_db_connection
 
 # Forzar UTF-8 para terminales Windows
 if sys.stdout.encoding != 'utf-8':
@@ -30,50 +30,16 @@ CAT_WEB = [
 # CONEXIÓN
 # ─────────────────────────────────────────────
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_db_connection(DB_PATH)
 
 # ─────────────────────────────────────────────
 # INICIALIZAR TABLAS
 # ─────────────────────────────────────────────
 def init_tablas():
+    # Las tablas apps, cuentas_web y notas_relacion se crean y migran en
+    # database.ensure_schema, igual que las de archivos
     conn = get_conn()
-    # Tabla de apps instaladas
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS apps (
-            id          INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre      TEXT NOT NULL,
-            plataforma  TEXT NOT NULL,
-            categoria   TEXT,
-            version     TEXT,
-            estado      TEXT DEFAULT 'Instalada',
-            es_gratis   INTEGER DEFAULT 1,
-            link_tienda TEXT,
-            notas       TEXT,
-            tags        TEXT,
-            fecha_reg   TEXT
-        )
-    """)
-    # Tabla de cuentas web
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS cuentas_web (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            sitio           TEXT NOT NULL,
-            url             TEXT,
-            categoria       TEXT,
-            email_usuario   TEXT,
-            estado          TEXT DEFAULT 'Activa',
-            plan            TEXT DEFAULT 'Gratuito',
-            tiene_2fa       INTEGER DEFAULT 0,
-            notas           TEXT,
-            tags            TEXT,
-            fecha_reg       TEXT
-        )
-    """)
-    conn.commit()
-    # Inicializar tabla de relaciones compartida
-    init_relaciones(conn)
+    ensure_schema(conn)
     conn.close()
 
 # ─────────────────────────────────────────────
@@ -1,8 +1,8 @@
-import sqlite3
 import os
 import math
 import sys
 import msvcrt
+import sqlite3
 import datetime
 import zipfile
 import json
@@ -12,6 +12,7 @@ from pathlib import Path
 from scanner import scan_directory
 from gestor_apps import menu_apps
 from relaciones import init_relaciones, mostrar_relaciones, menu_relaciones
+from database import get_db_connection, backup_db, fts_filter, path_like_filter
 
 # Forzar UTF-8 para que los emojis funcionen en cualquier terminal de Windows
 if sys.stdout.encoding != 'utf-8':
@@ -22,9 +23,7 @@ if sys.stderr.encoding != 'utf-8':
 db_path = os.path.join(os.path.dirname(__file__), "files.db")
 
 def get_connection():
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_db_connection(db_path)
 
 def abrir_recurso(archivo):
     """Logica unificada para abrir archivos locales o enlaces web."""
@@ -150,27 +149,32 @@ def explorar_archivos():
     SELECT f.id, f.filename, f.path, f.size, f.resource_type, f.modified_at, d.description 
     FROM files f
     LEFT JOIN descriptions d ON f.id = d.file_id
-    WHERE 1=1
+    WHERE f.missing_since IS NULL
     """
     params = []
+    conn = get_connection()
 
-    # Nombre/ruta inclusivo
+    # Nombre/ruta inclusivo (por el índice de trigramas si está activado)
     if ubicacion_inc:
-        query += " AND f.path LIKE ?"
-        params.append(f"%{ubicacion_inc}%")
+        cond, patron = path_like_filter(conn, ubicacion_inc)
+        query += f" AND {cond}"
+        params.append(patron)
     # Nombre/ruta excluyente
     if ubicacion_exc:
-        query += " AND f.path NOT LIKE ?"
-        params.append(f"%{ubicacion_exc}%")
-
-    # Tag inclusivo
-    if tag_inc:
-        query += " AND f.id IN (SELECT file_id FROM metadata WHERE key='tag' AND value LIKE ?)"
-        params.append(f"%{tag_inc}%")
+        cond, patron = path_like_filter(conn, ubicacion_exc, exclude=True)
+        query += f" AND {cond}"
+        params.append(patron)
+
+    # Tag inclusivo (índice de texto completo: sin tildes ni mayúsculas, por prefijo)
+    cond, fts = fts_filter(tag_inc, ["tags"])
+    if cond:
+        query += f" AND {cond}"
+        params.append(fts)
     # Tag excluyente
-    if tag_exc:
-        query += " AND f.id NOT IN (SELECT file_id FROM metadata WHERE key='tag' AND value LIKE ?)"
-        params.append(f"%{tag_exc}%")
+    cond, fts = fts_filter(tag_exc, ["tags"], exclude=True)
+    if cond:
+        query += f" AND {cond}"
+        params.append(fts)
 
     # Tiempo
     if dias.isdigit():
@@ -212,7 +216,6 @@ def explorar_archivos():
 
     query += " ORDER BY f.modified_at DESC"
 
-    conn = get_connection()
     c = conn.cursor()
     c.execute(query, params)
     resultados = c.fetchall()
@@ -380,13 +383,20 @@ def exportar_importar_ia(conn):
         print("✅ Generado 'archivos_para_ia.txt'.")
     elif opc == '2':
         if not os.path.exists("respuestas.txt"): print("❌ No hay 'respuestas.txt'."); return
+        importadas, omitidas = 0, []
         with open("respuestas.txt", "r", encoding="utf-8") as f:
-            for line in f:
-                if '|' in line:
-                    fid, tags = line.strip().split('|')
-                    for t in tags.split(','):
-                        c.execute("INSERT INTO metadata (file_id, key, value) VALUES (?, 'tag', ?)", (fid.strip(), t.strip().lower()))
-        conn.commit(); print("✅ Importado.")
+            for n, line in enumerate(f, 1):
+                if '|' not in line: continue
+                fid, tags = line.strip().split('|', 1)
+                # Un ID que ya no está en files viola la clave foránea: se omite la línea
+                try:
+                    c.executemany("INSERT INTO metadata (file_id, key, value) VALUES (?, 'tag', ?)",
+                                  [(fid.strip(), t.strip().lower()) for t in tags.split(',')])
+                    importadas += 1
+                except sqlite3.IntegrityError:
+                    omitidas.append(n)
+        conn.commit(); print(f"✅ Importado ({importadas} líneas).")
+        if omitidas: print(f"⚠️  {len(omitidas)} líneas omitidas por ID inexistente: {', '.join(map(str, omitidas))}")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # IMPORTAR ARCHIVOS DE NUBES (JSON) A LA BASE DE DATOS LOCAL
@@ -483,11 +493,16 @@ def crear_respaldo_ahora():
     backup_dir = os.path.join(os.path.dirname(__file__), "respaldos")
     fecha = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     ruta_zip = os.path.join(backup_dir, f"respaldo_bd_{fecha}.zip")
+    copia = ruta_zip + ".db"
     try:
+        # Copia consistente con backup_db (incluye lo que aún está en el WAL)
+        backup_db(copia, db_path)
         with zipfile.ZipFile(ruta_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(db_path, "files.db")
+            zipf.write(copia, "files.db")
         print(f"✅ Respaldo creado: {ruta_zip}")
     except Exception as e: print(f"❌ Error: {e}")
+    finally:
+        if os.path.exists(copia): os.remove(copia)
 
 def menu_principal():
     verificar_y_crear_respaldo()
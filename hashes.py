@@ -0,0 +1,245 @@
+"""
+hashes.py
+─────────
+Calcula el hash de contenido de los archivos indexados y lo guarda en la BD:
+    - files.hash         → hash del contenido completo
+    - files.hash_parcial → hash rápido: primeros y últimos PARCIAL_KB + tamaño
+    - files.hash_firma   → "size|modified_at" del archivo cuando se hasheó
+
+Un hash solo se recalcula si la firma guardada ya no coincide con el
+size/modified_at actual de la fila (es decir, si el escáner vio un cambio).
+Los archivos se leen por bloques de tamaño fijo (BUFFER_BYTES), nunca
+enteros en memoria, y el trabajo se reparte en un pool de procesos.
+
+buscar_duplicados() usa estos hashes por etapas: primero agrupa por tamaño
+en SQL, luego hash parcial solo de los tamaños repetidos y, por último, hash
+completo solo de los que además coinciden en el parcial.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from database import get_db_connection, ensure_schema, path_prefix_range, write_lock
+
+# Tamaño del bloque de lectura (memoria fija por proceso)
+BUFFER_BYTES = 1024 * 1024
+
+# KB leídos al principio y al final del archivo en el hash parcial
+PARCIAL_KB = 64
+
+# Filas escritas por transacción al guardar los hashes
+BATCH_SIZE = 500
+
+
+def _nuevo_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_completo(path: str) -> str:
+    """Hash del contenido completo, leyendo por bloques con un buffer reutilizado."""
+    h = _nuevo_hash()
+    buffer = bytearray(BUFFER_BYTES)
+    vista  = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(vista[:n])
+    return h.hexdigest()
+
+
+def hash_parcial(path: str, kb: int = PARCIAL_KB) -> str:
+    """
+    Hash rápido para archivos enormes: tamaño + primeros y últimos `kb` KB.
+    Si el archivo cabe entero en esas dos ventanas, equivale a hashear todo.
+    """
+    n = kb * 1024
+    h = _nuevo_hash()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        h.update(str(size).encode())
+        h.update(f.read(n))
+        if size > 2 * n:
+            f.seek(-n, os.SEEK_END)
+            h.update(f.read(n))
+        elif size > n:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _hashear_uno(tarea):
+    """Función del pool de procesos: (id, path, parcial) → (id, hash | None)."""
+    file_id, path, parcial = tarea
+    try:
+        return file_id, (hash_parcial(path) if parcial else hash_completo(path))
+    except OSError:
+        return file_id, None
+
+
+def hashear_pendientes(conn, root_dir=None, parcial: bool = False,
+                       workers: int = None, ids=None) -> dict:
+    """
+    Calcula los hashes que falten o estén desactualizados.
+
+    root_dir: limita a los archivos bajo esa carpeta (None = toda la BD).
+    parcial : calcula hash_parcial en lugar del hash completo.
+    ids     : limita a esos ids de files (lo usa buscar_duplicados).
+    Devuelve {'hasheados': n, 'errores': n}.
+    """
+    columna = "hash_parcial" if parcial else "hash"
+    q = (
+        "SELECT id, path, size || '|' || modified_at AS firma FROM files "
+        "WHERE resource_type = 'local' AND missing_since IS NULL "
+        f"AND ({columna} IS NULL OR hash_firma IS NOT size || '|' || modified_at)"
+    )
+    params = []
+    if root_dir is not None:
+        q += " AND path >= ? AND path < ?"
+        params.extend(path_prefix_range(root_dir))
+    if ids is not None:
+        q += " AND id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(ids)))
+    pendientes = conn.execute(q, params).fetchall()
+
+    resultado = {'hasheados': 0, 'errores': 0}
+    if not pendientes:
+        return resultado
+
+    firmas = {r['id']: r['firma'] for r in pendientes}
+    tareas = [(r['id'], r['path'], parcial) for r in pendientes]
+
+    # Si la firma cambió, el otro hash (parcial/completo) también quedó viejo
+    otra = "hash" if parcial else "hash_parcial"
+    sql = (
+        f"UPDATE files SET {columna} = ?, "
+        f"{otra} = CASE WHEN hash_firma IS ? THEN {otra} ELSE NULL END, "
+        "hash_firma = ? "
+        "WHERE id = ? AND size || '|' || modified_at IS ?"
+    )
+
+    lote = []
+
+    def _volcar():
+        with write_lock:
+            conn.execute("BEGIN")
+            conn.executemany(sql, lote)
+            conn.commit()
+        lote.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_id, valor in pool.map(_hashear_uno, tareas, chunksize=16):
+            if valor is None:
+                resultado['errores'] += 1
+                continue
+            firma = firmas[file_id]
+            lote.append((valor, firma, firma, file_id, firma))
+            resultado['hasheados'] += 1
+            if len(lote) >= BATCH_SIZE:
+                _volcar()
+    if lote:
+        _volcar()
+    return resultado
+
+
+def buscar_duplicados(conn, min_size: int = 1, root_dir=None, workers: int = None) -> list:
+    """
+    Busca archivos locales con contenido idéntico, en tres etapas:
+      1. GROUP BY size en SQL → solo los tamaños repetidos son candidatos.
+      2. Hash parcial de esos candidatos → se descartan los que difieren.
+      3. Hash completo solo de los que coinciden en el parcial (si el archivo
+         cabe entero en la ventana del parcial, el parcial ya es definitivo).
+    Los hashes quedan guardados, así que repetir la búsqueda es casi gratis.
+
+    Devuelve grupos ordenados por bytes desperdiciados:
+      [{'size', 'hash', 'paths': [...], 'desperdicio': size * (n - 1)}]
+    """
+    filtro = "resource_type = 'local' AND missing_since IS NULL AND size >= ?"
+    params = [min_size]
+    if root_dir is not None:
+        filtro += " AND path >= ? AND path < ?"
+        params.extend(path_prefix_range(root_dir))
+
+    # ── Etapa 1: tamaños repetidos ────────────────────────────────────────
+    candidatos = [r[0] for r in conn.execute(
+        f"SELECT id FROM files WHERE {filtro} AND size IN "
+        f"(SELECT size FROM files WHERE {filtro} GROUP BY size HAVING COUNT(*) > 1)",
+        params + params
+    )]
+    if not candidatos:
+        return []
+
+    # ── Etapa 2: hash parcial solo de los candidatos ──────────────────────
+    hashear_pendientes(conn, parcial=True, workers=workers, ids=candidatos)
+    ventana = 2 * PARCIAL_KB * 1024
+    filas = conn.execute(
+        "SELECT id, size, hash_parcial FROM files "
+        "WHERE id IN (SELECT value FROM json_each(?)) AND hash_parcial IS NOT NULL",
+        (json.dumps(candidatos),)
+    ).fetchall()
+    por_parcial = {}
+    for r in filas:
+        por_parcial.setdefault((r['size'], r['hash_parcial']), []).append(r['id'])
+    grandes = [
+        i for (size, _), grupo in por_parcial.items()
+        if len(grupo) > 1 and size > ventana for i in grupo
+    ]
+
+    # ── Etapa 3: hash completo solo de colisiones del parcial ─────────────
+    if grandes:
+        hashear_pendientes(conn, parcial=False, workers=workers, ids=grandes)
+
+    grupos = {}
+    filas = conn.execute(
+        "SELECT id, path, size, hash_parcial, hash FROM files "
+        "WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps([i for g in por_parcial.values() if len(g) > 1 for i in g]),)
+    ).fetchall()
+    for r in filas:
+        if r['size'] > ventana:
+            if r['hash'] is None:
+                continue
+            clave = (r['size'], r['hash'])
+        else:
+            clave = (r['size'], r['hash_parcial'])
+        grupos.setdefault(clave, []).append(r['path'])
+
+    resultado = [
+        {'size': size, 'hash': h, 'paths': sorted(paths), 'desperdicio': size * (len(paths) - 1)}
+        for (size, h), paths in grupos.items() if len(paths) > 1
+    ]
+    resultado.sort(key=lambda g: g['desperdicio'], reverse=True)
+    return resultado
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Calcula hashes de contenido de files.db")
+    parser.add_argument("ruta", nargs="?", help="Carpeta a hashear (por defecto toda la BD)")
+    parser.add_argument("--parcial", action="store_true",
+                        help=f"Hash rápido: primeros y últimos {PARCIAL_KB} KB + tamaño")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos del pool (por defecto, núcleos de CPU)")
+    parser.add_argument("--duplicados", action="store_true",
+                        help="Busca archivos duplicados en lugar de hashear todo")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    ensure_schema(conn)
+    raiz = Path(args.ruta).resolve() if args.ruta else None
+    if args.duplicados:
+        grupos = buscar_duplicados(conn, root_dir=raiz, workers=args.workers)
+        for g in grupos:
+            print(f"\n🧬 {len(g['paths'])} copias de {g['size']} bytes — "
+                  f"desperdicio: {g['desperdicio']} bytes")
+            for p in g['paths']:
+                print(f"   {p}")
+        print(f"\n✅ Grupos: {len(grupos)}  |  "
+              f"Desperdicio total: {sum(g['desperdicio'] for g in grupos)} bytes")
+    else:
+        res = hashear_pendientes(conn, raiz, parcial=args.parcial, workers=args.workers)
+        print(f"✅ Hasheados: {res['hasheados']}  |  ❌ Errores: {res['errores']}")
+    conn.close()
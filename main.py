@@ -1,165 +1,619 @@
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 import os
+import json
 import sys
-
-# DEBUG LOGGING - CRITICAL FOR DIAGNOSIS
-debug_file = os.path.join(os.path.dirname(__file__), "debug_start.log")
-with open(debug_file, "a") as f:
-    f.write(f"Starting server... Python: {sys.executable}\n")
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 # Load environment variables from .env file (Absolute Path)
 env_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path=env_path)
 
-from scanner import scan_directory
-from database import get_db_connection
-from ai_handler import get_ai_handler
+# DEBUG LOGGING - for diagnosing how the MCP client launches the server.
+# Off unless DEBUG_START_LOG=true: every client session starts a new server.
+if os.getenv("DEBUG_START_LOG", "false").lower() == "true":
+    debug_file = os.path.join(os.path.dirname(__file__), "debug_start.log")
+    with open(debug_file, "a") as f:
+        f.write(f"Starting server... Python: {sys.executable}\n")
+
+from scanner import scan_directory, ProgresoEscaneo
+from database import (
+    get_db_connection, ConnectionPool, fts_match, FTS_RANK, sandboxed,
+    ResultCache, normalize_sql, is_cacheable_sql, init_db,
+)
+from difuso import IndiceDifuso
 
 # Initialize FastMCP
 mcp = FastMCP("Personal File Server")
 
-@mcp.tool()
-def scan_files(path: str) -> str:
-    """Scans a directory and updates the database with file information. Args: path (absolute path to directory)"""
-    if not os.path.exists(path):
-        return f"Error: Path {path} does not exist."
-    
+# Tool calls borrow pooled connections (DB_POOL_READERS readers plus one writer)
+# instead of connecting per call. Scans and find_duplicates are long batch jobs
+# and keep opening their own connection.
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))
+db_pool = ConnectionPool(readers=DB_POOL_READERS)
+
+# The AI handler, and the Gemini SDK it imports, is created on the first
+# generate_ai_metadata call instead of at startup, then reused.
+_ai_handler = None
+
+def _get_ai_handler():
+    global _ai_handler
+    if _ai_handler is None:
+        from ai_handler import get_ai_handler
+        _ai_handler = get_ai_handler()
+    return _ai_handler
+
+# In-memory typo-tolerant filename index for fuzzy_search_files. Built on its
+# first use, then refreshed incrementally before each search and after each scan.
+fuzzy_index = IndiceDifuso()
+
+# Background scan jobs: scan_files returns a job id at once and the scan runs in
+# this executor. Scans of different roots walk in parallel; their writes are
+# serialized by database.write_lock.
+SCAN_JOBS_MAX = int(os.getenv("SCAN_JOBS_MAX", "2"))
+_scan_executor = None
+_scan_jobs = {}
+_scan_jobs_lock = threading.Lock()
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+_JOB_STATES = {"pendiente": "queued", "recorriendo": "scanning", "finalizando": "finishing",
+               "completo": "done", "interrumpido": "cancelled", "error": "error"}
+
+def _job_running(job):
+    return not job["future"].done()
+
+def _run_scan_job(job, **kwargs):
     try:
-        scan_directory(path)
-        return f"Successfully scanned {path}"
+        scan_directory(job["path"], progreso=job["progress"], cancelar=job["cancel"], **kwargs)
     except Exception as e:
-        return f"Error scanning {path}: {str(e)}"
+        job["progress"].fase = "error"
+        job["error"] = str(e)
+    finally:
+        if job["progress"].fin is None:
+            job["progress"].fin = time.monotonic()
+    if fuzzy_index.construido:
+        with db_pool.reader() as conn:
+            fuzzy_index.actualizar(conn)
+
+def _describe_job(job):
+    p = job["progress"]
+    state = _JOB_STATES.get(p.fase, p.fase)
+    elapsed = (p.fin or time.monotonic()) - p.inicio
+    rate = p.examinados / elapsed if elapsed > 0 else 0.0
+    lines = [
+        f"Job {job['id']} [{state}] {job['path']}",
+        f"  examined {p.examinados} files ({rate:,.0f} files/s), new {p.nuevos}, "
+        f"updated {p.actualizados}, unchanged {p.sin_cambios}, skipped {p.omitidos}, errors {p.errores}",
+    ]
+    if p.fase == "completo":
+        lines.append(f"  moved {p.movidos}, missing {p.desaparecidos}, now excluded {p.excluidos}; "
+                     f"took {_format_seconds(elapsed)}")
+        if p.tiempos:
+            lines.append("  time per stage:")
+            lines.extend(f"    {stage}: {t['segundos']:.3f}s ({t['veces']} calls)"
+                         for stage, t in p.tiempos.items())
+    elif p.fase == "interrumpido":
+        lines.append(f"  cancelled after {_format_seconds(elapsed)}; "
+                     f"run scan_files with resume=true to continue")
+    elif job.get("error"):
+        lines.append(f"  error: {job['error']}")
+    else:
+        eta = "unknown (first scan of this path)"
+        if p.total_estimado and rate > 0:
+            remaining = max(p.total_estimado - p.examinados, 0)
+            eta = f"~{_format_seconds(remaining / rate)} (based on {p.total_estimado} files indexed before)"
+        lines.append(f"  elapsed {_format_seconds(elapsed)}, ETA {eta}")
+    return "\n".join(lines)
+
+# Every tool takes format='text' (readable) or format='json': compact JSON with
+# no indentation, where tabular results are column-oriented,
+# {"columns": [...], "rows": [[...], ...]}, so column names are sent once
+OUTPUT_FORMATS = ("text", "json")
+_FORMAT_ERROR = f"Error: format must be one of: {', '.join(OUTPUT_FORMATS)}."
+
+def _compact_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _table(columns, rows, **extra):
+    return _compact_json({**extra, "columns": list(columns), "rows": [list(r) for r in rows]})
+
+def _error(format, message):
+    return _compact_json({"error": message}) if format == "json" else f"Error: {message}"
 
 @mcp.tool()
-def search_files(query: str) -> str:
-    """Searches for files in the database by filename (SQL LIKE). Args: query (search term)"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    search_term = f"%{query}%"
-    c.execute("SELECT path, filename, size FROM files WHERE filename LIKE ?", (search_term,))
-    results = c.fetchall()
-    conn.close()
+def scan_files(path: str, incremental: bool = False, workers: int = 1, purge_missing: bool = False,
+               hash_mode: str = "off", resume: bool = False, stage_timings: bool = False,
+               format: str = "text") -> str:
+    """Starts a background scan of a directory and returns its job id right away; poll it with
+    scan_status and stop it with cancel_scan. Files under the path that no longer exist are marked
+    as missing (or deleted with their tags, descriptions and relations if purge_missing is true).
+    Every committed batch also checkpoints the folders already done, so an interrupted or cancelled
+    scan can be continued with resume=true instead of starting over.
+    Args: path (absolute path to directory), incremental (only write new or changed files),
+    workers (threads used to walk folders in parallel; useful on network drives),
+    purge_missing (delete vanished files instead of marking them),
+    hash_mode ('off', 'partial' or 'full': content hash of new/changed files),
+    resume (continue the last unfinished scan of this path, keeping its mode),
+    stage_timings (measure time spent listing, stat-ing, matching exclusions, querying, writing
+    and committing; shown by scan_status when the scan ends), format ('text' or 'json')"""
+    global _scan_executor
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    if not os.path.exists(path):
+        return _error(format, f"Path {path} does not exist.")
     
-    if not results:
-        return "No files found."
+    hashear = {"off": None, "partial": "parcial", "full": "completo"}.get(hash_mode)
+    if hash_mode not in ("off", "partial", "full"):
+        return _error(format, "hash_mode must be 'off', 'partial' or 'full'.")
     
-    return "\n".join([f"{r['filename']} ({r['path']}) - {r['size']} bytes" for r in results])
+    root = str(Path(path).resolve())
+    with _scan_jobs_lock:
+        # Two scans over the same tree would fight over the same rows
+        for job in _scan_jobs.values():
+            other = job["path"]
+            if _job_running(job) and (root == other or root.startswith(other.rstrip(os.sep) + os.sep)
+                                      or other.startswith(root.rstrip(os.sep) + os.sep)):
+                return _error(format, f"job {job['id']} is already scanning {other}.")
+        if _scan_executor is None:
+            _scan_executor = ThreadPoolExecutor(max_workers=SCAN_JOBS_MAX, thread_name_prefix="scan-job")
+        job = {
+            "id": uuid.uuid4().hex[:8],
+            "path": root,
+            "progress": ProgresoEscaneo(),
+            "cancel": threading.Event(),
+            "error": None,
+        }
+        job["future"] = _scan_executor.submit(
+            _run_scan_job, job, incremental=incremental, workers=workers, purgar=purge_missing,
+            hashear=hashear, reanudar=resume, tiempos=stage_timings)
+        _scan_jobs[job["id"]] = job
+    if format == "json":
+        return _compact_json({"job_id": job["id"], "path": root})
+    return f"Scan started: job {job['id']} for {root}. Use scan_status('{job['id']}') to follow it."
 
 @mcp.tool()
-def get_file_metadata(path: str) -> str:
-    """Retrieves metadata and description for a specific file. Args: path (full file path)"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM files WHERE path = ?", (path,))
-    file_record = c.fetchone()
-    
-    if not file_record:
-        conn.close()
-        return "File not found in database. Try scanning the directory first."
-    
-    # Get metadata
-    c.execute("SELECT key, value FROM metadata WHERE file_id = ?", (file_record['id'],))
-    metadata = {row['key']: row['value'] for row in c.fetchall()}
+def scan_status(job_id: str = "", format: str = "text") -> str:
+    """Reports the progress of background scans: files examined, files/s, new/updated/errors and
+    an ETA based on how many files the path had in the last scan.
+    Args: job_id (job returned by scan_files; empty lists every job), format ('text', or 'json'
+    for the structured scan result of each job, including stage timings, one row per job)"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    if job_id:
+        jobs = [_scan_jobs.get(job_id)]
+        if jobs[0] is None:
+            return _error(format, f"unknown job {job_id}.")
+    else:
+        jobs = list(_scan_jobs.values())
+    if format == "json":
+        fields = list(ProgresoEscaneo().como_dict())
+        rows = []
+        for j in jobs:
+            result = j["progress"].como_dict()
+            rows.append([j["id"], j["path"], j["error"], *(result[f] for f in fields)])
+        return _table(["job_id", "path", "error", *fields], rows)
+    if not jobs:
+        return "No scan jobs."
+    return "\n".join(_describe_job(j) for j in jobs)
+
+@mcp.tool()
+def cancel_scan(job_id: str, format: str = "text") -> str:
+    """Cancels a running background scan. What was already written is kept, and the scan can be
+    continued later with scan_files(path, resume=true).
+    Args: job_id (job returned by scan_files), format ('text' or 'json')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    job = _scan_jobs.get(job_id)
+    if job is None:
+        return _error(format, f"unknown job {job_id}.")
+    if not _job_running(job):
+        status, message = "not_running", f"Job {job_id} is not running ({job['progress'].fase})."
+    elif job["future"].cancel():
+        job["progress"].fase = "interrumpido"
+        status, message = "cancelled", f"Job {job_id} cancelled before it started."
+    else:
+        job["cancel"].set()
+        status, message = "cancelling", f"Cancelling job {job_id}; it stops after saving its current batch."
+    if format == "json":
+        return _compact_json({"job_id": job_id, "status": status})
+    return message
+
+# search_files returns one page at a time (at most SEARCH_LIMIT_MAX rows) and
+# only counts matches up to SEARCH_COUNT_CAP, so broad terms stay cheap
+SEARCH_LIMIT_MAX = 500
+SEARCH_COUNT_CAP = 10_000
+_SEARCH_ORDERS = {
+    "relevance": FTS_RANK,
+    "name": "f.filename COLLATE NOCASE",
+    "newest": "f.modified_at DESC",
+    "largest": "f.size DESC",
+}
+_SEARCH_COLUMNS = ("path", "filename", "size")
+
+def _format_file_rows(rows):
+    """Formats rows one by one as the cursor yields them."""
+    for r in rows:
+        yield f"{r['filename']} ({r['path']}) - {r['size']} bytes"
+
+@mcp.tool()
+def search_files(query: str, limit: int = 50, offset: int = 0, order_by: str = "relevance",
+                 format: str = "text") -> str:
+    """Searches files by words in their name, folder path, description or tags. Matching ignores
+    case and accents, every word must appear, words match as prefixes ('infor' finds 'informe').
+    Results come in pages; the header gives the number of matches and the offset of the next page.
+    Files that have vanished from disk since they were indexed are left out.
+    Args: query (search terms), limit (results per page, max 500), offset (results to skip),
+    order_by ('relevance' = name hits first, 'name', 'newest' or 'largest'), format ('text' or
+    'json': columns path/filename/size plus total, total_is_lower_bound and next_offset)"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    if order_by not in _SEARCH_ORDERS:
+        return _error(format, f"order_by must be one of: {', '.join(_SEARCH_ORDERS)}.")
+    limit = max(1, min(limit, SEARCH_LIMIT_MAX))
+    offset = max(0, offset)
     
-    # Get descriptions
-    c.execute("SELECT description, source FROM descriptions WHERE file_id = ?", (file_record['id'],))
-    descriptions = [f"[{row['source']}] {row['description']}" for row in c.fetchall()]
+    match = fts_match(query)
+    total, page = 0, []
+    if match is not None:
+        with db_pool.reader() as conn:
+            total = conn.execute("""SELECT COUNT(*) FROM (
+                                        SELECT 1 FROM files_fts JOIN files f ON f.id = files_fts.rowid
+                                        WHERE files_fts MATCH ? AND f.missing_since IS NULL LIMIT ?)""",
+                                 (match, SEARCH_COUNT_CAP + 1)).fetchone()[0]
+            if total:
+                rows = conn.execute(f"""SELECT {', '.join('f.' + c for c in _SEARCH_COLUMNS)}
+                                        FROM files_fts JOIN files f ON f.id = files_fts.rowid
+                                        WHERE files_fts MATCH ? AND f.missing_since IS NULL
+                                        ORDER BY {_SEARCH_ORDERS[order_by]}, f.id LIMIT ? OFFSET ?""",
+                                    (match, limit, offset))
+                page = [tuple(r) for r in rows] if format == "json" else list(_format_file_rows(rows))
+    next_offset = offset + len(page) if page and offset + len(page) < total else None
     
-    conn.close()
+    if format == "json":
+        return _table(_SEARCH_COLUMNS, page, total=min(total, SEARCH_COUNT_CAP),
+                      total_is_lower_bound=total > SEARCH_COUNT_CAP, next_offset=next_offset)
+    if total == 0:
+        return "No files found."
+    total_text = f"{total:,}" if total <= SEARCH_COUNT_CAP else f"more than {SEARCH_COUNT_CAP:,}"
+    if not page:
+        return f"No more results: {total_text} matches in total."
+    header = f"Results {offset + 1}-{offset + len(page)} of {total_text} matches (order: {order_by})."
+    if next_offset is not None:
+        header += f" Next page: offset={next_offset}."
+    return "\n".join([header, *page])
+
+@mcp.tool()
+def fuzzy_search_files(query: str, limit: int = 10, format: str = "text") -> str:
+    """Typo-tolerant search by file name: 'reprote' finds 'reporte_2023.pdf'. Every word of the
+    query must be within a few typos of a word in the name (or of its beginning); case and accents
+    are ignored and numbers must match exactly. Results are ranked by similarity (1.0 = exact).
+    Args: query (words of the file name), limit (max results, up to 500), format ('text' or 'json')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    limit = max(1, min(limit, SEARCH_LIMIT_MAX))
+    rows = {}
+    with db_pool.reader() as conn:
+        fuzzy_index.actualizar(conn)
+        hits = fuzzy_index.buscar(query, limite=limit)
+        ids = [file_id for file_id, _, _ in hits]
+        # Same batch size as IndiceDifuso.actualizar, well under SQLite's variable limit
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            rows.update((r['id'], r) for r in conn.execute(
+                f"SELECT id, path, filename, size FROM files WHERE id IN ({','.join('?' * len(batch))}) "
+                "AND missing_since IS NULL", batch))
+    results = [(rows[file_id], score, typos) for file_id, score, typos in hits if file_id in rows]
     
-    output = [
-        f"File: {file_record['filename']}",
-        f"Path: {file_record['path']}",
-        f"Size: {file_record['size']} bytes",
-        f"Created: {file_record['created_at']}",
+    if format == "json":
+        return _table(("path", "filename", "size", "similarity", "typos"),
+                      ((r['path'], r['filename'], r['size'], score, typos) for r, score, typos in results))
+    if not results:
+        return "No files found."
+    return "\n".join(f"{r['filename']} ({r['path']}) - {r['size']} bytes [similarity {score:.2f}, typos: {typos}]"
+                     for r, score, typos in results)
+
+# get_files_metadata resolves at most this many paths + ids per call
+METADATA_BATCH_MAX = 200
+_FILE_FIELDS = ("id", "path", "filename", "extension", "size", "created_at", "modified_at",
+                "resource_type", "missing_since")
+
+def _load_files(conn, paths, ids):
+    """{file id: record} for the given paths and/or ids, with their metadata and
+    descriptions. Always 3 queries, however many files are asked for."""
+    rows = conn.execute(f"""SELECT {', '.join(_FILE_FIELDS)} FROM files
+                            WHERE path IN (SELECT value FROM json_each(?))
+                               OR id IN (SELECT value FROM json_each(?))""",
+                        (json.dumps(paths), json.dumps(ids)))
+    found = {r['id']: dict(r, metadata={}, descriptions=[]) for r in rows}
+    if not found:
+        return found
+    found_ids = json.dumps(list(found))
+    rows = conn.execute("""SELECT file_id, key, value FROM metadata
+                           WHERE file_id IN (SELECT value FROM json_each(?)) ORDER BY id""", (found_ids,))
+    for r in rows:
+        found[r['file_id']]['metadata'].setdefault(r['key'], []).append(r['value'])
+    rows = conn.execute("""SELECT file_id, description, source, model_used FROM descriptions
+                           WHERE file_id IN (SELECT value FROM json_each(?)) ORDER BY id""", (found_ids,))
+    for r in rows:
+        found[r['file_id']]['descriptions'].append(
+            {"source": r['source'], "description": r['description'], "model_used": r['model_used']})
+    return found
+
+def _describe_file(record):
+    return "\n".join([
+        f"File: {record['filename']}",
+        f"Path: {record['path']}",
+        f"Size: {record['size']} bytes",
+        f"Created: {record['created_at']}",
+        *([f"Missing from disk since: {record['missing_since']}"] if record['missing_since'] else []),
         "Metadata:",
-        *[f"  {k}: {v}" for k, v in metadata.items()],
+        *[f"  {k}: {', '.join(str(v) for v in values)}" for k, values in record['metadata'].items()],
         "Descriptions:",
-        *[f"  {d}" for d in descriptions]
-    ]
-    return "\n".join(output)
+        *[f"  [{d['source']}] {d['description']}" for d in record['descriptions']]
+    ])
+
+@mcp.tool()
+def get_file_metadata(path: str, format: str = "text") -> str:
+    """Retrieves metadata and description for a specific file.
+    Args: path (full file path), format ('text' or 'json')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    with db_pool.reader() as conn:
+        found = _load_files(conn, [path], [])
+    if not found:
+        return _error(format, "File not found in database. Try scanning the directory first.")
+    record = next(iter(found.values()))
+    return _compact_json(record) if format == "json" else _describe_file(record)
 
 @mcp.tool()
-def generate_ai_metadata(path: str) -> str:
-    """Generates AI description and tags for a file (if AI is enabled). Args: path (full file path)"""
-    ai = get_ai_handler()
+def get_files_metadata(paths: list[str] | None = None, ids: list[int] | None = None,
+                       format: str = "json") -> str:
+    """Retrieves metadata, tags and descriptions for many files in one call (use it instead of calling
+    get_file_metadata repeatedly). Files come in the order asked. With format='json' (default) the
+    result is {"columns": [...], "rows": [...], "not_found": [...]}; each row has the file fields,
+    "metadata" (key -> list of values) and "descriptions". format='text' gives readable blocks.
+    Args: paths (full file paths), ids (file ids); up to 200 in total, format ('json' or 'text')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    paths, ids = list(dict.fromkeys(paths or [])), list(dict.fromkeys(ids or []))
+    if not paths and not ids:
+        return _error(format, "give at least one path or id.")
+    if len(paths) + len(ids) > METADATA_BATCH_MAX:
+        return _error(format, f"at most {METADATA_BATCH_MAX} paths + ids per call.")
+    
+    with db_pool.reader() as conn:
+        found = _load_files(conn, paths, ids)
+    
+    by_path = {f['path']: f for f in found.values()}
+    files, not_found, listed = [], [], set()
+    for key, record in [(p, by_path.get(p)) for p in paths] + [(i, found.get(i)) for i in ids]:
+        if record is None:
+            not_found.append(key)
+        elif record['id'] not in listed:
+            listed.add(record['id'])
+            files.append(record)
+    
+    if format == "json":
+        columns = [*_FILE_FIELDS, "metadata", "descriptions"]
+        return _table(columns, ([f[c] for c in columns] for f in files), not_found=not_found)
+    blocks = [_describe_file(f) for f in files]
+    if not_found:
+        blocks.append("Not found: " + ", ".join(str(k) for k in not_found))
+    return "\n\n".join(blocks)
+
+@mcp.tool()
+def generate_ai_metadata(path: str, format: str = "text") -> str:
+    """Generates AI description and tags for a file (if AI is enabled).
+    Args: path (full file path), format ('text' or 'json')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    ai = _get_ai_handler()
     if not ai.enabled:
-        return "AI mode is disabled. Set AI_ENABLED=true environment variable to enable."
+        return _error(format, "AI mode is disabled. Set AI_ENABLED=true environment variable to enable.")
     
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id FROM files WHERE path = ?", (path,))
-    file_record = c.fetchone()
+    with db_pool.reader() as conn:
+        file_record = conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
     
     if not file_record:
-        conn.close()
-        return "File not found in database. Try scanning directory first."
+        return _error(format, "File not found in database. Try scanning directory first.")
     
-    # Generate content (mock or real)
+    # Generate content (mock or real). The AI call runs before taking the writer,
+    # so a slow model never blocks other writes.
     try:
         description = ai.generate_description(path)
         tags = ai.generate_tags(path)
         
         # Save to DB
-        c.execute("SELECT id FROM descriptions WHERE file_id = ? AND source = 'AI'", (file_record['id'],))
-        existing_desc = c.fetchone()
-        
-        if existing_desc:
-            c.execute("UPDATE descriptions SET description = ?, model_used = ? WHERE id = ?",
-                      (description, ai.model, existing_desc['id']))
-        else:
-            c.execute("INSERT INTO descriptions (file_id, description, source, model_used) VALUES (?, ?, ?, ?)",
-                      (file_record['id'], description, "AI", ai.model))
-        
-        for tag in tags:
-            # Check for existing tag to avoid duplicates?
-            c.execute("SELECT id FROM metadata WHERE file_id=? AND key=? AND value=?", (file_record['id'], "tag", tag))
-            if not c.fetchone():
-                c.execute("INSERT INTO metadata (file_id, key, value) VALUES (?, ?, ?)",
-                        (file_record['id'], "tag", tag))
-            
-        conn.commit()
-        conn.close()
+        with db_pool.writer() as conn:
+            _save_ai_metadata(conn, file_record['id'], description, tags, ai.model)
         
+        if format == "json":
+            return _compact_json({"description": description, "tags": tags})
         return f"AI metadata generated: {description} | Tags: {tags}"
     except Exception as e:
+        return _error(format, f"generating metadata: {str(e)}")
+
+def _save_ai_metadata(conn, file_id, description, tags, model):
+    c = conn.cursor()
+    c.execute("SELECT id FROM descriptions WHERE file_id = ? AND source = 'AI'", (file_id,))
+    existing_desc = c.fetchone()
+    
+    if existing_desc:
+        c.execute("UPDATE descriptions SET description = ?, model_used = ? WHERE id = ?",
+                  (description, model, existing_desc['id']))
+    else:
+        c.execute("INSERT INTO descriptions (file_id, description, source, model_used) VALUES (?, ?, ?, ?)",
+                  (file_id, description, "AI", model))
+    
+    for tag in tags:
+        # Check for existing tag to avoid duplicates?
+        c.execute("SELECT id FROM metadata WHERE file_id=? AND key=? AND value=?", (file_id, "tag", tag))
+        if not c.fetchone():
+            c.execute("INSERT INTO metadata (file_id, key, value) VALUES (?, ?, ?)",
+                    (file_id, "tag", tag))
+
+@mcp.tool()
+def find_duplicates(min_size: int = 1, path: str = "", limit: int = 50, format: str = "text") -> str:
+    """Finds local files with identical content. Files are grouped by size first, then by a
+    partial hash, and only partial-hash collisions get a full hash (hashes are cached in the DB).
+    Args: min_size (ignore files smaller than this, in bytes), path (optional folder to limit the
+    search), limit (max groups returned, largest wasted space first), format ('text' or 'json':
+    one row per group with size, wasted bytes and paths)"""
+    from hashes import buscar_duplicados
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    
+    conn = get_db_connection()
+    try:
+        groups = buscar_duplicados(conn, min_size=min_size, root_dir=path or None)
+    finally:
         conn.close()
-        return f"Error generating metadata: {str(e)}"
+    
+    total_wasted = sum(g['desperdicio'] for g in groups)
+    if format == "json":
+        return _table(("size", "wasted", "paths"),
+                      ((g['size'], g['desperdicio'], g['paths']) for g in groups[:limit]),
+                      groups=len(groups), total_wasted=total_wasted)
+    if not groups:
+        return "No duplicate files found."
+    
+    output = [f"{len(groups)} duplicate groups, {total_wasted} bytes wasted in total."]
+    for g in groups[:limit]:
+        output.append(f"\n{len(g['paths'])} copies of {g['size']} bytes - {g['desperdicio']} bytes wasted:")
+        output.extend(f"  {p}" for p in g['paths'])
+    return "\n".join(output)
+
+# query_database runs client SQL through database.sandboxed: reads only, stopped
+# after QUERY_TIMEOUT_SEC, and at most QUERY_ROWS_MAX rows are fetched
+QUERY_TIMEOUT_SEC = float(os.getenv("QUERY_TIMEOUT_SEC", "5"))
+QUERY_ROWS_MAX = 1000
+_FETCH_CHUNK = 100
+
+# Results of query_database, reused until anything writes to files.db
+QUERY_CACHE_BYTES = int(os.getenv("QUERY_CACHE_BYTES", str(16 * 1024 * 1024)))
+query_cache = ResultCache(max_bytes=QUERY_CACHE_BYTES)
+
+def _query_plan(conn, query):
+    """EXPLAIN QUERY PLAN rows as (id, parent, detail)."""
+    return [(r[0], r[1], r[3]) for r in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+
+def _format_plan(plan):
+    depth = {0: -1}
+    lines = []
+    for node, parent, detail in plan:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append(f"{'  ' * depth[node]}{detail}")
+    return "\n".join(lines)
 
 @mcp.tool()
-def query_database(query: str) -> str:
+def query_database(query: str, max_rows: int = 200, explain: bool = False, format: str = "text") -> str:
     """Executes a READ-ONLY SQL query against the files database. Use this for counting, aggregation, or filtering.
-    Allowed: SELECT. Blocked: INSERT, UPDATE, DELETE, DROP.
+    Only reads are allowed (SELECT, WITH ... SELECT); anything that writes is rejected. Queries
+    running longer than a few seconds are stopped, and at most max_rows rows are returned.
     Example: 'SELECT COUNT(*) FROM files' or 'SELECT SUM(size) FROM files'
-    Args: query (SQL string)"""
+    Args: query (SQL string), max_rows (rows returned, up to 1000),
+    explain (return the query plan instead of running it; SCAN means reading a whole table,
+    SEARCH means using an index), format ('text' = one JSON object per row, or 'json' = compact
+    columns + rows, with "truncated" when more rows were left out; much smaller for large results)"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    max_rows = max(1, min(max_rows, QUERY_ROWS_MAX))
     
-    # 1. Basic security check (prevent modification)
-    normalized_query = query.strip().upper()
-    if not normalized_query.startswith("SELECT"):
-        return "Error: Only SELECT queries are allowed for safety."
-        
-    prevent_keywords = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "TRUNCATE"]
-    for kw in prevent_keywords:
-        if kw in normalized_query:
-            return f"Error: Query contains forbidden keyword '{kw}'. Read-only access allowed."
+    # Repeated queries are answered from query_cache until the database changes
+    key = (normalize_sql(query), max_rows, explain, format)
+    cacheable = QUERY_CACHE_BYTES > 0 and is_cacheable_sql(query)
+    if cacheable:
+        output, version = query_cache.get(key)
+        if output is not None:
+            return output
 
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute(query)
-        results = c.fetchall()
-        conn.close()
-        
-        if not results:
-            return "Query executed successfully but returned no results."
-            
-        # Format results converting Row objects to dicts
-        import json
-        return json.dumps([dict(row) for row in results], indent=2, default=str)
-        
+        output = _run_query(query, max_rows, explain, format)
     except Exception as e:
-        return f"Database Error: {str(e)}"
+        message = str(e)
+        if message == "interrupted":
+            return _error(format, f"query stopped after {QUERY_TIMEOUT_SEC:g}s. "
+                                  "Check its plan with explain=true, or narrow it with WHERE/LIMIT.")
+        if message == "not authorized":
+            return _error(format, "only read-only queries are allowed (SELECT, WITH ... SELECT).")
+        if format == "json":
+            return _compact_json({"error": f"Database error: {message}"})
+        return f"Database Error: {message}"
+    if cacheable:
+        query_cache.put(key, output, version)
+    return output
+
+def _run_query(query, max_rows, explain, format):
+    with db_pool.reader() as conn, sandboxed(conn, timeout=QUERY_TIMEOUT_SEC):
+        if explain:
+            plan = _query_plan(conn, query)
+            if format == "json":
+                return _table(("id", "parent", "detail"), plan)
+            return _format_plan(plan) or "Empty query plan."
+        cursor = conn.execute(query)
+        if cursor.description is None:
+            raise ValueError("the query returned no columns. Only SELECT queries are allowed.")
+        columns = [d[0] for d in cursor.description]
+        # Rows are fetched in chunks and only one past max_rows, to know
+        # whether the result was cut without reading all of it
+        results = []
+        while len(results) <= max_rows:
+            chunk = cursor.fetchmany(min(_FETCH_CHUNK, max_rows + 1 - len(results)))
+            if not chunk:
+                break
+            results.extend(chunk)
+        cursor.close()
+    truncated = len(results) > max_rows
+    results = results[:max_rows]
+    
+    if format == "json":
+        return _table(columns, results, truncated=truncated)
+    
+    if not results:
+        return "Query executed successfully but returned no results."
+        
+    # Format results converting Row objects to dicts
+    output = json.dumps([dict(row) for row in results], indent=2, default=str)
+    if truncated:
+        output += f"\n(first {max_rows} rows shown; there are more. Add LIMIT/OFFSET or aggregate.)"
+    return output
+
+@mcp.tool()
+def query_cache_stats(format: str = "text") -> str:
+    """Shows how well query_database's result cache is doing: hits, misses, hit rate, cached
+    entries and bytes, and how many times writes to the database emptied it.
+    Args: format ('text' or 'json')"""
+    if format not in OUTPUT_FORMATS:
+        return _FORMAT_ERROR
+    stats = query_cache.stats()
+    if format == "json":
+        return _compact_json(stats)
+    if QUERY_CACHE_BYTES <= 0:
+        return "Query cache is disabled (QUERY_CACHE_BYTES=0)."
+    hit_rate = f"{stats['hit_rate']:.0%}" if stats['hit_rate'] is not None else "n/a"
+    return "\n".join([
+        f"Query cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {hit_rate})",
+        f"  {stats['entries']} entries, {stats['bytes']:,} of {stats['max_bytes']:,} bytes",
+        f"  emptied {stats['invalidations']} times by writes to the database",
+    ])
 
 if __name__ == "__main__":
-    mcp.run()
+    # Bring files.db up to the current schema before the pool lends any
+    # connection: its readers are query-only and can't migrate
+    init_db()
+    try:
+        mcp.run()
+    finally:
+        db_pool.close()
+        query_cache.close()
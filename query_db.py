@@ -1,12 +1,13 @@
 import sqlite3
 import os
+from database import get_db_connection
 
 db_path = os.path.join(os.path.dirname(__file__), "files.db")
 
 print(f"Conectando a la base de datos: {db_path}\n")
 
 try:
-    conn = sqlite3.connect(db_path)
+    conn = get_db_connection(db_path)
     c = conn.cursor()
 
     # Obtener el número total de archivos
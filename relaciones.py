@@ -12,6 +12,8 @@ Las relaciones son BIDIRECCIONALES: crear A→B hace que B también vea a A.
 import sqlite3
 import os
 
+from database import ensure_schema
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "files.db")
 
 TABLAS_VALIDAS = ["files", "apps", "cuentas_web"]
@@ -21,18 +23,8 @@ TABLAS_LABELS  = {"files": "Archivo/Link", "apps": "App", "cuentas_web": "Cuenta
 # INICIALIZAR TABLA
 # ─────────────────────────────────────────────
 def init_relaciones(conn):
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS notas_relacion (
-            id            INTEGER PRIMARY KEY AUTOINCREMENT,
-            origen_tabla  TEXT    NOT NULL,
-            origen_id     INTEGER NOT NULL,
-            descripcion   TEXT    NOT NULL,
-            destino_tabla TEXT    NOT NULL,
-            destino_id    INTEGER NOT NULL,
-            fecha_reg     TEXT
-        )
-    """)
-    conn.commit()
+    # notas_relacion (y sus índices) forma parte del esquema versionado
+    ensure_schema(conn)
 
 # ─────────────────────────────────────────────
 # OBTENER NOMBRE LEGIBLE DE UN REGISTRO
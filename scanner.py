@@ -1,27 +1,22 @@
 import os
+import queue
+import threading
+import time
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from database import get_db_connection
+from database import get_db_connection, ensure_schema, path_prefix_range, write_lock
+from hashes import hashear_pendientes
+from exclusiones import cargar_exclusiones, REGLAS_PATH
 
 # ─────────────────────────────────────────────────────────────────────────────
-# REGLAS DE EXCLUSIÓN
+# REGLAS DE EXCLUSIÓN  (ver exclusiones.py y exclusiones.txt)
 # ─────────────────────────────────────────────────────────────────────────────
 
-# Extensiones de archivos de sistema/basura que se ignoran siempre
-EXTENSIONES_IGNORADAS = {
-    '.ini', '.tmp', '.temp', '.lnk', '.sys', '.dll', '.log',
-    '.ds_store', '.thumbs', '.bak',
-}
-
-# Nombres de archivo exactos que se ignoran siempre (en minúsculas)
-NOMBRES_IGNORADOS = {
-    'desktop.ini', 'thumbs.db', '.ds_store', 'ntuser.dat',
-    'ntuser.ini', 'ntuser.pol',
-}
-
-# Prefijos de carpeta que se saltan (ocultas o de sistema)
-CARPETAS_SKIP_PREFIJOS = ('.', '$', '~')
+# Reglas por defecto, compiladas una vez (las usa vigilante.py); cada
+# escaneo compila las suyas para llevar sus propios contadores de aciertos
+EXCLUSIONES = cargar_exclusiones()
 
 # Longitud máxima del NOMBRE DE ARCHIVO que se guarda en BD
 # (el path completo puede ser largo; solo recortamos el campo "filename")
@@ -30,23 +25,74 @@ MAX_FILENAME_LEN = 150
 # Tamaño del lote para commit a la BD (mejora rendimiento con 12k+ archivos)
 BATCH_SIZE = 500
 
+# Aunque no haya archivos que escribir (modo incremental sin cambios), las
+# carpetas completadas se guardan como checkpoint al menos cada tantos segundos
+CHECKPOINT_SEG = 10.0
+
 
 # ─────────────────────────────────────────────────────────────────────────────
+# CRONÓMETRO POR ETAPAS (opcional)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class CronometroEtapas:
+    """
+    Acumula segundos y número de llamadas por etapa del escaneo (listado,
+    stat, exclusiones, consultas_bd, escritura_bd, commit, movimientos, …).
+    Es seguro entre hilos; con varios workers, los tiempos de listado, stat
+    y exclusiones son la suma de todos los hilos.
+    """
+    activo = True
+
+    def __init__(self):
+        self.segundos = {}
+        self.veces    = {}
+        self._lock    = threading.Lock()
+
+    def reloj(self) -> float:
+        return time.perf_counter()
+
+    def sumar(self, etapa: str, desde: float, veces: int = 1):
+        dt = time.perf_counter() - desde
+        with self._lock:
+            self.segundos[etapa] = self.segundos.get(etapa, 0.0) + dt
+            self.veces[etapa]    = self.veces.get(etapa, 0) + veces
+
+    def como_dict(self) -> dict:
+        return {
+            etapa: {'segundos': round(seg, 4), 'veces': self.veces[etapa]}
+            for etapa, seg in sorted(self.segundos.items(), key=lambda x: x[1], reverse=True)
+        }
 
-def _es_ignorable(file_path: Path) -> bool:
-    """Devuelve True si el archivo debe ser omitido."""
-    nombre = file_path.name.lower()
-    ext    = file_path.suffix.lower()
 
-    if nombre in NOMBRES_IGNORADOS:
-        return True
-    if ext in EXTENSIONES_IGNORADAS:
-        return True
-    # Archivos ocultos de Windows/Linux
-    if nombre.startswith('.') or nombre.startswith('~'):
-        return True
-    return False
+class _CronometroNulo:
+    """Misma interfaz que CronometroEtapas, sin medir nada (la opción por defecto)."""
+    activo = False
 
+    def reloj(self) -> float:
+        return 0.0
+
+    def sumar(self, etapa: str, desde: float, veces: int = 1):
+        pass
+
+
+SIN_CRONO = _CronometroNulo()
+
+
+def _cronometrar_iter(iterable, crono, etapa: str):
+    """Recorre iterable sumando a `etapa` el tiempo de obtener cada elemento."""
+    it = iter(iterable)
+    while True:
+        t = crono.reloj()
+        try:
+            elemento = next(it)
+        except StopIteration:
+            crono.sumar(etapa, t)
+            return
+        crono.sumar(etapa, t)
+        yield elemento
+
+
+# ─────────────────────────────────────────────────────────────────────────────
 
 def _recortar_nombre(filename: str, max_len: int = MAX_FILENAME_LEN) -> str:
     """
@@ -62,7 +108,664 @@ def _recortar_nombre(filename: str, max_len: int = MAX_FILENAME_LEN) -> str:
     return stem[:recorte] + "..." + suffix
 
 
-def scan_directory(directory_path: str):
+def _cargar_conocidos(c, root_dir: Path) -> dict:
+    """
+    Carga de una sola vez los archivos locales ya indexados bajo root_dir:
+      { path: (id, size, modified_at como texto, missing_since, inode) }
+    Se usa en modo incremental para comparar en memoria sin consultar la BD
+    archivo por archivo.
+    """
+    desde, hasta = path_prefix_range(root_dir)
+    c.execute(
+        "SELECT id, path, size, modified_at, missing_since, inode FROM files "
+        "WHERE resource_type = 'local' AND path >= ? AND path < ?",
+        (desde, hasta)
+    )
+    return {
+        row['path']: (row['id'], row['size'], row['modified_at'],
+                      row['missing_since'], row['inode'])
+        for row in c.fetchall()
+    }
+
+
+def _examinar_archivo(root: str, file: str, stat_fn=None, excl=None, rel=None,
+                      crono=SIN_CRONO) -> tuple:
+    """
+    Aplica las reglas de exclusión y obtiene los datos de un archivo.
+
+    stat_fn permite reutilizar un stat ya disponible (p. ej. DirEntry.stat
+    de os.scandir); si es None se hace Path.stat().
+    excl es el conjunto de reglas (por defecto EXCLUSIONES) y rel la ruta
+    relativa a la raíz escaneada, que solo hace falta si hay reglas ancladas.
+    crono mide las etapas "exclusiones" y "stat" (ver CronometroEtapas).
+
+    Devuelve (estado, registro):
+      - ("omitido", None)    → archivo de sistema/basura
+      - ("error", None)      → no se pudo construir el path o leer stats
+      - ("ok", registro)     → registro listo para guardar
+      - ("recorte", registro)→ path > 260 que ni con el prefijo de ruta
+                               extendida se pudo leer; se guarda con el
+                               path truncado y datos básicos
+    registro = (path, filename, extension, size, created_at, modified_at,
+                inode, device)
+    inode/device quedan en None si el sistema no los informa (p. ej. DirEntry
+    en Windows devuelve 0).
+    """
+    # ── Construcción segura del path ──────────────────────────────────────
+    try:
+        file_path = Path(root) / file
+        path_str  = str(file_path)
+    except Exception:
+        return "error", None
+
+    # ── Regla 1: reglas de exclusión (sistema/basura y exclusiones.txt) ───
+    t = crono.reloj()
+    excluido = (excl or EXCLUSIONES).excluye_archivo(file, rel)
+    crono.sumar("exclusiones", t)
+    if excluido:
+        return "omitido", None
+
+    extension         = file_path.suffix.lower()
+    filename_guardado = _recortar_nombre(file)
+
+    # ── Regla 2: path demasiado largo para Windows ────────────────────────
+    if len(path_str) > 260:
+        # Intentamos con el prefijo \\?\ que levanta el límite
+        path_str_ext = "\\\\?\\" + path_str
+        t = crono.reloj()
+        try:
+            stats = Path(path_str_ext).stat()
+            crono.sumar("stat", t)
+        except Exception:
+            # Si aún falla, guardamos el registro con datos básicos
+            # usando el nombre recortado — el path queda truncado
+            ahora = datetime.now()
+            return "recorte", (path_str[:255], filename_guardado, extension,
+                               0, ahora, ahora, None, None)
+    else:
+        # ── Caso normal ───────────────────────────────────────────────────
+        t = crono.reloj()
+        try:
+            stats = stat_fn() if stat_fn else file_path.stat()
+        except Exception:
+            return "error", None
+        finally:
+            crono.sumar("stat", t)
+
+    return "ok", (path_str, filename_guardado, extension, stats.st_size,
+                  datetime.fromtimestamp(stats.st_ctime),
+                  datetime.fromtimestamp(stats.st_mtime),
+                  stats.st_ino or None, stats.st_dev or None)
+
+
+def _carpeta_saltable(nombre: str, excl=None, rel=None, crono=SIN_CRONO) -> bool:
+    """Carpetas que no se recorren (ocultas, de sistema o excluidas por regla)."""
+    t = crono.reloj()
+    saltable = (excl or EXCLUSIONES).excluye_carpeta(nombre, rel)
+    crono.sumar("exclusiones", t)
+    return saltable
+
+
+def _rel(base: str, nombre: str):
+    """Ruta relativa de un hijo; base es None si no hay reglas ancladas."""
+    if base is None:
+        return None
+    return os.path.join(base, nombre) if base else nombre
+
+
+def _walk_secuencial(root_dir: Path, excl, completadas=frozenset(), crono=SIN_CRONO):
+    """
+    Recorrido clásico con os.walk en un solo hilo. Genera (estado, registro)
+    y, tras los archivos de cada carpeta, ("carpeta", ruta). Las carpetas de
+    `completadas` (checkpoint de un escaneo interrumpido) se recorren para
+    llegar a sus subcarpetas, pero sus archivos no se vuelven a examinar.
+    """
+    largo = len(str(root_dir)) + 1
+    for root, dirs, files in _cronometrar_iter(os.walk(root_dir), crono, "listado"):
+        base = root[largo:] if excl.usa_rutas else None
+        # Poda: las carpetas excluidas no se llegan a listar
+        dirs[:] = [d for d in dirs if not _carpeta_saltable(d, excl, _rel(base, d), crono)]
+        if root in completadas:
+            continue
+        for file in files:
+            yield _examinar_archivo(root, file, excl=excl, rel=_rel(base, file), crono=crono)
+        yield "carpeta", root
+
+
+def _listar_directorio(directorio: str, excl, largo: int, completadas=frozenset(),
+                       crono=SIN_CRONO) -> tuple:
+    """
+    Lista un directorio con os.scandir y examina sus archivos reutilizando
+    DirEntry.stat(). Devuelve (subdirectorios_a_recorrer, resultados), con
+    ("carpeta", directorio) al final de los resultados (ver _walk_secuencial).
+    Mismas reglas que os.walk: los enlaces simbólicos a carpetas no se siguen
+    y los errores al listar se ignoran. largo es la longitud del path de la
+    raíz + 1, para sacar rutas relativas si hay reglas ancladas.
+    """
+    base = directorio[largo:] if excl.usa_rutas else None
+    ya_completa = directorio in completadas
+    subdirs, resultados = [], []
+    try:
+        with os.scandir(directorio) as it:
+            for entry in _cronometrar_iter(it, crono, "listado"):
+                try:
+                    es_dir = entry.is_dir()
+                except OSError:
+                    es_dir = False
+                rel = _rel(base, entry.name)
+                if es_dir:
+                    if not entry.is_symlink() and not _carpeta_saltable(entry.name, excl, rel, crono):
+                        subdirs.append(entry.path)
+                elif not ya_completa:
+                    resultados.append(
+                        _examinar_archivo(directorio, entry.name, entry.stat, excl, rel, crono))
+    except OSError:
+        pass
+    if not ya_completa:
+        resultados.append(("carpeta", directorio))
+    return subdirs, resultados
+
+
+def _walk_paralelo(root_dir: Path, workers: int, excl, completadas=frozenset(),
+                   crono=SIN_CRONO):
+    """
+    Recorrido en paralelo: cada carpeta es una tarea del pool; al terminar de
+    listarla, la propia tarea encola sus subcarpetas y deja sus resultados en
+    una cola que consume el hilo llamador (el único que escribe en la BD).
+    Genera (estado, registro), igual que _walk_secuencial.
+    """
+    cola       = queue.Queue(maxsize=workers * 4)
+    cancelar   = threading.Event()
+    lock       = threading.Lock()
+    pendientes = [0]
+    FIN        = object()
+    largo      = len(str(root_dir)) + 1
+
+    def _poner(item):
+        # put con timeout para no bloquear para siempre si el consumidor se fue
+        while not cancelar.is_set():
+            try:
+                cola.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _enviar(pool, directorio):
+        if cancelar.is_set():
+            return
+        with lock:
+            pendientes[0] += 1
+        pool.submit(_tarea, pool, directorio)
+
+    def _tarea(pool, directorio):
+        try:
+            if cancelar.is_set():
+                return
+            subdirs, resultados = _listar_directorio(directorio, excl, largo, completadas, crono)
+            for sd in subdirs:
+                _enviar(pool, sd)
+            if resultados:
+                _poner(resultados)
+        finally:
+            with lock:
+                pendientes[0] -= 1
+                terminado = pendientes[0] == 0
+            if terminado:
+                _poner(FIN)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        _enviar(pool, str(root_dir))
+        while True:
+            item = cola.get()
+            if item is FIN:
+                break
+            yield from item
+    finally:
+        cancelar.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Cada fila escrita queda sellada con la generación del escaneo (scan_gen) y
+# deja de estar marcada como desaparecida
+_SQL_UPSERT = (
+    "INSERT INTO files (path, filename, extension, size, created_at, modified_at, "
+    "inode, device, scan_gen) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(path) DO UPDATE SET "
+    "size=excluded.size, modified_at=excluded.modified_at, created_at=excluded.created_at, "
+    "inode=excluded.inode, device=excluded.device, "
+    "scan_gen=excluded.scan_gen, missing_since=NULL"
+)
+
+# Paths truncados por emergencia: solo se insertan si no existen (si ya
+# existen solo se sellan como vistos)
+_SQL_INSERT_SI_FALTA = (
+    "INSERT INTO files (path, filename, extension, size, created_at, modified_at, "
+    "inode, device, scan_gen) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(path) DO UPDATE SET scan_gen=excluded.scan_gen, missing_since=NULL"
+)
+
+
+class _EscritorLotes:
+    """
+    Acumula registros y los vuelca a la BD de a BATCH_SIZE con un solo
+    executemany de INSERT ... ON CONFLICT(path) DO UPDATE por lote, dentro
+    de una transacción explícita. Reemplaza el SELECT + INSERT/UPDATE que
+    se hacía por cada archivo.
+
+    En la misma transacción guarda el checkpoint: las carpetas terminadas
+    (todos sus archivos ya están en este lote o en uno anterior) y el número
+    de lotes confirmados del escaneo.
+    """
+
+    def __init__(self, conn, scan_gen, crono=SIN_CRONO):
+        self.conn          = conn
+        self.scan_gen      = scan_gen
+        self.crono         = crono
+        self.upserts       = []   # [(registro, existe)] existe: True/False/None
+        self.inserciones   = []   # [registro] (paths truncados)
+        self.carpetas      = []   # carpetas terminadas aún sin checkpoint
+        self.ultimo_volcado = time.monotonic()
+        self.count_new     = 0
+        self.count_updated = 0
+        self.count_errors  = 0
+        self.escritos      = 0
+        self.inicio        = time.perf_counter()
+
+    def agregar(self, registro, existe=None):
+        """existe=None → se averigua al volcar el lote con una sola consulta."""
+        self.upserts.append((registro, existe))
+        self._quizas_volcar()
+
+    def agregar_si_falta(self, registro):
+        self.inserciones.append(registro)
+        self._quizas_volcar()
+
+    def terminar_carpeta(self, carpeta: str):
+        self.carpetas.append(carpeta)
+        if (len(self.carpetas) >= BATCH_SIZE
+                or time.monotonic() - self.ultimo_volcado >= CHECKPOINT_SEG):
+            self.volcar()
+
+    def _guardar_checkpoint(self, carpetas):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO scan_carpetas (scan_id, dir) VALUES (?, ?)",
+            ((self.scan_gen, d) for d in carpetas)
+        )
+        self.conn.execute("UPDATE scans SET lotes = lotes + 1 WHERE id = ?", (self.scan_gen,))
+
+    def _quizas_volcar(self):
+        if len(self.upserts) + len(self.inserciones) >= BATCH_SIZE:
+            self.volcar()
+            velocidad = self.escritos / max(time.perf_counter() - self.inicio, 1e-9)
+            print(f"  💾 Lote guardado — nuevos: {self.count_new}, "
+                  f"actualizados: {self.count_updated} ({velocidad:,.0f} filas/s) …")
+
+    def _paths_existentes(self, paths) -> set:
+        if not paths:
+            return set()
+        t = self.crono.reloj()
+        ph = ",".join("?" * len(paths))
+        rows = self.conn.execute(f"SELECT path FROM files WHERE path IN ({ph})", paths).fetchall()
+        self.crono.sumar("consultas_bd", t)
+        return {r[0] for r in rows}
+
+    def volcar(self):
+        """Escribe el lote pendiente (y su checkpoint) en una única transacción."""
+        if not self.upserts and not self.inserciones and not self.carpetas:
+            return
+        with write_lock:
+            self._volcar_lote()
+
+    def _volcar_lote(self):
+        upserts, inserciones, carpetas = self.upserts, self.inserciones, self.carpetas
+        self.upserts, self.inserciones, self.carpetas = [], [], []
+        self.ultimo_volcado = time.monotonic()
+
+        dudosos = [r[0] for r, existe in upserts if existe is None]
+        dudosos += [r[0] for r in inserciones]
+        existentes = self._paths_existentes(dudosos)
+
+        nuevos = actualizados = 0
+        for registro, existe in upserts:
+            if existe is None:
+                existe = registro[0] in existentes
+            if existe:
+                actualizados += 1
+            else:
+                nuevos += 1
+        nuevos += sum(1 for r in inserciones if r[0] not in existentes)
+
+        filas       = [r + (self.scan_gen,) for r, _ in upserts]
+        inserciones = [r + (self.scan_gen,) for r in inserciones]
+        try:
+            t = self.crono.reloj()
+            self.conn.execute("BEGIN")
+            self.conn.executemany(_SQL_UPSERT, filas)
+            self.conn.executemany(_SQL_INSERT_SI_FALTA, inserciones)
+            self._guardar_checkpoint(carpetas)
+            self.crono.sumar("escritura_bd", t, len(filas) + len(inserciones))
+            t = self.crono.reloj()
+            self.conn.commit()
+            self.crono.sumar("commit", t)
+        except Exception:
+            # Si el lote completo falla, se reintenta fila por fila para no
+            # perder los registros válidos por culpa de uno defectuoso
+            self.conn.rollback()
+            self._volcar_fila_a_fila(upserts, inserciones, existentes, carpetas)
+            return
+
+        self.count_new     += nuevos
+        self.count_updated += actualizados
+        self.escritos      += len(filas) + len(inserciones)
+
+    def _volcar_fila_a_fila(self, upserts, inserciones, existentes, carpetas):
+        self.conn.execute("BEGIN")
+        for registro, existe in upserts:
+            if existe is None:
+                existe = registro[0] in existentes
+            try:
+                self.conn.execute(_SQL_UPSERT, registro + (self.scan_gen,))
+            except Exception:
+                self.count_errors += 1
+                continue
+            if existe:
+                self.count_updated += 1
+            else:
+                self.count_new += 1
+            self.escritos += 1
+        for registro in inserciones:
+            try:
+                self.conn.execute(_SQL_INSERT_SI_FALTA, registro + (self.scan_gen,))
+            except Exception:
+                self.count_errors += 1
+                continue
+            if registro[0] not in existentes:
+                self.count_new += 1
+            self.escritos += 1
+        self._guardar_checkpoint(carpetas)
+        self.conn.commit()
+
+
+# Archivos locales bajo la raíz que este escaneo no vio: no quedaron sellados
+# con scan_gen ni están entre los ids vistos sin cambios (temp.vistos)
+_COND_NO_VISTOS = (
+    "resource_type = 'local' AND path >= ? AND path < ? "
+    "AND scan_gen IS NOT ? AND id NOT IN (SELECT id FROM temp.vistos)"
+)
+
+
+def _registrar_vistos(conn, vistos_sin_cambios: list):
+    """
+    Guarda en una tabla TEMP los ids vistos sin cambios en modo incremental
+    (no se reescriben, así que no reciben scan_gen). Así detectar ausentes o
+    movidos es una sola sentencia en vez de una comprobación por fila.
+    """
+    conn.execute("BEGIN")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS vistos (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.vistos")
+    conn.executemany("INSERT INTO temp.vistos (id) VALUES (?)",
+                     ((i,) for i in vistos_sin_cambios))
+    conn.commit()
+
+
+_COLUMNAS_MOVIMIENTO = "id, path, size, modified_at, inode, device, hash, hash_firma"
+
+
+def _filas_movimiento(conn, root_dir: Path, scan_gen: int, id_max_previo: int) -> tuple:
+    """(desaparecidos, nuevos) candidatos a emparejarse como movimientos.
+    Si no hay desaparecidos, los nuevos no se consultan y vienen vacíos."""
+    desde, hasta = path_prefix_range(root_dir)
+    columnas = _COLUMNAS_MOVIMIENTO
+    ausentes = conn.execute(
+        f"SELECT {columnas} FROM files WHERE ({_COND_NO_VISTOS}) "
+        f"UNION SELECT {columnas} FROM files "
+        "WHERE resource_type = 'local' AND missing_since IS NOT NULL",
+        (desde, hasta, scan_gen)
+    ).fetchall()
+    if not ausentes:
+        return [], []
+    nuevos = conn.execute(
+        f"SELECT {columnas}, filename, extension, created_at FROM files "
+        "WHERE id > ? AND scan_gen = ?",
+        (id_max_previo, scan_gen)
+    ).fetchall()
+    return ausentes, nuevos
+
+
+def _hashear_candidatos(conn, root_dir: Path, scan_gen: int, id_max_previo: int) -> int:
+    """
+    Los archivos nuevos aún no tienen hash: se calcula solo para los que
+    coinciden en (size, mtime) con un desaparecido que sí lo tiene, para que
+    _detectar_movimientos pueda emparejarlos por contenido. Se llama sin
+    tomar write_lock (leer los archivos es lo lento; hashear_pendientes lo
+    toma solo para guardar cada lote). Devuelve cuántos se hashearon.
+    """
+    ausentes, nuevos = _filas_movimiento(conn, root_dir, scan_gen, id_max_previo)
+    con_hash = {
+        (r['size'], r['modified_at']) for r in ausentes
+        if r['hash'] is not None and r['hash_firma'] == f"{r['size']}|{r['modified_at']}"
+    }
+    por_hashear = [
+        n['id'] for n in nuevos
+        if n['hash'] is None and (n['size'], n['modified_at']) in con_hash
+    ]
+    if not por_hashear:
+        return 0
+    return hashear_pendientes(conn, ids=por_hashear)['hasheados']
+
+
+def _detectar_movimientos(conn, root_dir: Path, scan_gen: int, id_max_previo: int,
+                          id_max_corrida: int = None) -> tuple:
+    """
+    Empareja archivos que desaparecieron con archivos nuevos de este mismo
+    escaneo que son el mismo archivo movido/renombrado:
+      - mismo (device, inode) + size + modified_at, o
+      - mismo hash de contenido + size + modified_at.
+    Solo se aceptan parejas únicas (sin ambigüedad). Para cada pareja se
+    borra la fila recién insertada y se reescribe el path en la fila antigua,
+    que conserva sus tags, descripciones (incluidas las de IA) y relaciones.
+
+    Desaparecidos = no vistos bajo la raíz + los ya marcados en cualquier lado
+    (cubre movimientos desde fuera de la raíz escaneada). Los hashes de los
+    nuevos los calcula antes _hashear_candidatos; aquí solo se leen.
+    Devuelve (movimientos aplicados, cuántos de ellos tienen la fila nueva
+    insertada en esta corrida: id > id_max_corrida). Difieren al reanudar,
+    porque las filas insertadas antes de la interrupción también se emparejan.
+    """
+    if id_max_corrida is None:
+        id_max_corrida = id_max_previo
+    ausentes, nuevos = _filas_movimiento(conn, root_dir, scan_gen, id_max_previo)
+    if not nuevos:
+        return 0, 0
+
+    def _claves(r):
+        claves = []
+        if r['inode'] is not None and r['device'] is not None:
+            claves.append(("ino", r['device'], r['inode'], r['size'], r['modified_at']))
+        firma = f"{r['size']}|{r['modified_at']}"
+        if r['hash'] is not None and r['hash_firma'] == firma:
+            claves.append(("hash", r['hash'], r['size'], r['modified_at']))
+        return claves
+
+    def _indice(filas):
+        indice = {}
+        for r in filas:
+            for clave in _claves(r):
+                indice.setdefault(clave, []).append(r)
+        return indice
+
+    idx_ausentes, idx_nuevos = _indice(ausentes), _indice(nuevos)
+    parejas, usados = [], set()
+    for clave, candidatos in idx_nuevos.items():
+        viejos = idx_ausentes.get(clave, [])
+        if len(candidatos) != 1 or len(viejos) != 1:
+            continue
+        nuevo, viejo = candidatos[0], viejos[0]
+        if nuevo['id'] in usados or viejo['id'] in usados:
+            continue
+        usados.update((nuevo['id'], viejo['id']))
+        parejas.append((viejo, nuevo))
+
+    if not parejas:
+        return 0, 0
+    conn.execute("BEGIN")
+    try:
+        conn.executemany("DELETE FROM files WHERE id = ?", ((n['id'],) for _, n in parejas))
+        conn.executemany(
+            "UPDATE files SET path=?, filename=?, extension=?, size=?, created_at=?, "
+            "modified_at=?, inode=?, device=?, scan_gen=?, missing_since=NULL WHERE id=?",
+            ((n['path'], n['filename'], n['extension'], n['size'], n['created_at'],
+              n['modified_at'], n['inode'], n['device'], scan_gen, v['id'])
+             for v, n in parejas)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(parejas), sum(1 for _, n in parejas if n['id'] > id_max_corrida)
+
+
+def _borrar_en_cascada(c, tabla: str):
+    """Borra de files los ids de la tabla temporal `tabla`, junto con sus
+    metadata, descriptions y notas_relacion."""
+    c.execute(f"DELETE FROM metadata WHERE file_id IN (SELECT id FROM {tabla})")
+    c.execute(f"DELETE FROM descriptions WHERE file_id IN (SELECT id FROM {tabla})")
+    hay_relaciones = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='notas_relacion'"
+    ).fetchone()
+    if hay_relaciones:
+        c.execute(
+            f"DELETE FROM notas_relacion "
+            f"WHERE (origen_tabla = 'files' AND origen_id IN (SELECT id FROM {tabla})) "
+            f"   OR (destino_tabla = 'files' AND destino_id IN (SELECT id FROM {tabla}))"
+        )
+    c.execute(f"DELETE FROM files WHERE id IN (SELECT id FROM {tabla})")
+
+
+def _apartar_excluidos(conn, root_dir: Path, scan_gen: int, excl, purgar: bool = False) -> int:
+    """
+    Aparta los archivos bajo root_dir que este escaneo no vio porque ahora los
+    excluyen las reglas (p. ej. una carpeta node_modules/ indexada antes de
+    agregar la regla). No desaparecieron, así que no cuentan como ausentes y
+    se cuentan aparte: se marcan con missing_since, lo que los saca de las
+    búsquedas pero conserva sus tags, descripciones y relaciones (si la regla
+    se quita, el próximo escaneo los vuelve a ver y limpia la marca). Solo con
+    purgar=True se borran en cascada. Debe correr antes de detectar
+    movimientos y ausentes. Devuelve cuántos se marcaron o purgaron.
+    """
+    desde, hasta = path_prefix_range(root_dir)
+    largo = len(str(root_dir)) + 1
+    # Sin purgar, los ya marcados en un escaneo anterior no se vuelven a contar
+    sql = f"SELECT id, path FROM files WHERE {_COND_NO_VISTOS}"
+    if not purgar:
+        sql += " AND missing_since IS NULL"
+    ids = [
+        (r[0],) for r in conn.execute(sql, (desde, hasta, scan_gen))
+        if excl.excluye_ruta(r[1][largo:])
+    ]
+    if not ids:
+        return 0
+    c = conn.cursor()
+    conn.execute("BEGIN")
+    try:
+        if not purgar:
+            ahora = datetime.now()
+            c.executemany("UPDATE files SET missing_since = ? WHERE id = ?", ((ahora, i) for (i,) in ids))
+        else:
+            c.execute("DROP TABLE IF EXISTS temp.excluidos")
+            c.execute("CREATE TEMP TABLE excluidos (id INTEGER PRIMARY KEY)")
+            c.executemany("INSERT INTO temp.excluidos (id) VALUES (?)", ids)
+            _borrar_en_cascada(c, "temp.excluidos")
+            c.execute("DROP TABLE temp.excluidos")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ids)
+
+
+def _procesar_ausentes(conn, root_dir: Path, scan_gen: int, purgar: bool = False) -> int:
+    """
+    Marca con missing_since los archivos locales bajo root_dir que este
+    escaneo no vio (ver _COND_NO_VISTOS): una sola sentencia. Con
+    purgar=True se borran en cascada de metadata, descriptions y
+    notas_relacion, además de files.
+    Devuelve cuántos archivos quedaron marcados o purgados.
+    """
+    desde, hasta = path_prefix_range(root_dir)
+    c = conn.cursor()
+    params = (desde, hasta, scan_gen)
+
+    conn.execute("BEGIN")
+    try:
+        if not purgar:
+            c.execute(
+                f"UPDATE files SET missing_since = ? WHERE missing_since IS NULL AND {_COND_NO_VISTOS}",
+                (datetime.now(),) + params
+            )
+            total = c.rowcount
+        else:
+            c.execute("DROP TABLE IF EXISTS temp.ausentes")
+            c.execute(f"CREATE TEMP TABLE ausentes AS SELECT id FROM files WHERE {_COND_NO_VISTOS}", params)
+            total = c.execute("SELECT COUNT(*) FROM temp.ausentes").fetchone()[0]
+            if total:
+                _borrar_en_cascada(c, "temp.ausentes")
+            c.execute("DROP TABLE temp.ausentes")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return total
+
+
+class ProgresoEscaneo:
+    """
+    Estado de un escaneo en curso, pensado para leerlo desde otro hilo
+    (los trabajos en segundo plano de main.py). scan_directory lo va
+    actualizando y, al terminar, es también su resultado. total_estimado son
+    los archivos que la BD ya tenía bajo la raíz (None si es la primera vez),
+    y sirve para estimar el tiempo restante. tiempos queda con los segundos
+    por etapa si el escaneo se hizo con tiempos=True.
+    """
+
+    def __init__(self):
+        self.fase           = "pendiente"  # recorriendo | finalizando | completo | interrumpido | error
+        self.scan_id        = None
+        self.total_estimado = None
+        self.examinados     = 0
+        self.nuevos         = 0
+        self.actualizados   = 0
+        self.sin_cambios    = 0
+        self.omitidos       = 0
+        self.errores        = 0
+        self.movidos        = 0
+        self.desaparecidos  = 0
+        self.excluidos      = 0
+        self.hasheados      = None
+        self.tiempos        = None
+        self.inicio         = time.monotonic()
+        self.fin            = None
+
+    def como_dict(self) -> dict:
+        duracion = (self.fin or time.monotonic()) - self.inicio
+        return {
+            'fase': self.fase, 'scan_id': self.scan_id,
+            'examinados': self.examinados, 'nuevos': self.nuevos,
+            'actualizados': self.actualizados, 'sin_cambios': self.sin_cambios,
+            'omitidos': self.omitidos, 'errores': self.errores,
+            'movidos': self.movidos, 'desaparecidos': self.desaparecidos,
+            'excluidos': self.excluidos, 'hasheados': self.hasheados, 'segundos': round(duracion, 3),
+            'tiempos': self.tiempos,
+        }
+
+
+def scan_directory(directory_path: str, incremental: bool = False, workers: int = 1,
+                   purgar: bool = False, hashear: str = None, reglas: str = REGLAS_PATH,
+                   reanudar: bool = False, progreso: ProgresoEscaneo = None,
+                   cancelar: threading.Event = None, tiempos: bool = False):
     """
     Escanea el directorio recursivamente y agrega/actualiza archivos en la BD.
 
@@ -71,143 +774,327 @@ def scan_directory(directory_path: str):
     - Omite archivos con rutas superiores al límite de Windows (260 chars)
       o que den error de acceso; intenta igualmente guardar los que sí pasan.
     - Recorta nombres excesivamente largos antes de guardarlos en BD.
-    - Inserta en lotes (BATCH_SIZE) para mayor rendimiento con miles de archivos.
+    - Inserta en lotes (BATCH_SIZE) con un único executemany de
+      INSERT ... ON CONFLICT(path) DO UPDATE por lote (ver _EscritorLotes).
+    - Modo incremental: carga una vez (path, size, mtime) de lo ya indexado
+      bajo la raíz y solo escribe los archivos nuevos o que cambiaron; los
+      demás se cuentan como "sin cambios" y no tocan la BD.
+    - workers > 1: recorre carpetas en paralelo con un pool de hilos sobre
+      os.scandir (útil en unidades de red/NAS). La escritura en BD sigue
+      siendo de un único hilo, con los mismos commits por lote.
+    - Cada escaneo tiene una generación (id en la tabla scans) con la que se
+      sellan las filas que ve. Al terminar, los archivos locales bajo la raíz
+      que no se vieron se marcan con missing_since (o se borran en cascada si
+      purgar=True). Si vuelven a aparecer, la marca se limpia. Los que no se
+      vieron porque ahora los excluyen las reglas no cuentan como
+      desaparecidos: se marcan aparte, o se purgan con purgar=True (ver
+      _apartar_excluidos).
+    - Movimientos: un archivo nuevo que coincide con uno desaparecido (mismo
+      inode/device o mismo hash, y mismo size y mtime) se trata como movido:
+      se reescribe el path de la fila antigua, que conserva sus tags,
+      descripciones y relaciones (ver _detectar_movimientos).
+    - hashear="completo" | "parcial": al final calcula files.hash (o
+      hash_parcial) de los archivos nuevos o modificados (ver hashes.py).
+    - reglas: archivo de exclusiones estilo .gitignore (ver exclusiones.py).
+      Se compila una vez por escaneo; las carpetas excluidas se podan al
+      recorrer y el resumen muestra cuántas cosas excluyó cada regla.
+    - Checkpoints: cada lote confirmado guarda también las carpetas ya
+      terminadas (tabla scan_carpetas). Si el escaneo se interrumpe,
+      reanudar=True retoma el último escaneo sin terminar de esa raíz, con su
+      misma generación y modo, y no vuelve a examinar los archivos de esas
+      carpetas. (En modo incremental, un archivo borrado de una carpeta que
+      ya estaba completa antes de la interrupción se detecta en el siguiente
+      escaneo.)
+    - progreso / cancelar: para correr en segundo plano. progreso se va
+      actualizando (ver ProgresoEscaneo) y, si se activa el Event cancelar,
+      el escaneo se detiene como con Ctrl+C y queda listo para reanudar.
+      Las escrituras pasan por database.write_lock, así que varios escaneos
+      de raíces distintas en el mismo proceso no chocan al escribir.
+    - tiempos=True: mide cuánto se va en cada etapa (listado, stat,
+      exclusiones, consultas y escrituras en BD, commits y pasos finales) y
+      lo imprime en el resumen. Apagado no cuesta casi nada.
+
+    Devuelve el ProgresoEscaneo final (contadores, fase y tiempos).
     """
+    if progreso is None:
+        progreso = ProgresoEscaneo()
     conn = get_db_connection()
+    ensure_schema(conn)
     c = conn.cursor()
 
     root_dir = Path(directory_path).resolve()
     if not root_dir.exists():
         print(f"❌ Directorio no encontrado: {directory_path}")
+        progreso.fase = "error"
         conn.close()
-        return
+        return progreso
+
+    # ── Checkpoint: ¿hay un escaneo sin terminar de esta raíz? ───────────
+    # (las sesiones del vigilante tienen lotes NULL y no se reanudan)
+    pendiente = None
+    if reanudar:
+        pendiente = c.execute(
+            "SELECT id, lotes, incremental, id_max_previo FROM scans "
+            "WHERE root = ? AND finished_at IS NULL AND lotes IS NOT NULL "
+            "ORDER BY id DESC LIMIT 1",
+            (str(root_dir),)
+        ).fetchone()
+        if pendiente is None:
+            print("ℹ️  No hay un escaneo interrumpido de esta carpeta; empieza uno nuevo.")
 
-    print(f"📂 Escaneando: {root_dir}")
+    completadas = frozenset()
+    if pendiente is not None:
+        scan_gen      = pendiente['id']
+        incremental   = bool(pendiente['incremental'])
+        id_max_previo = pendiente['id_max_previo']
+        # Las filas de esta corrida son las de id mayor que este; las que van
+        # de id_max_previo hasta acá se insertaron antes de la interrupción
+        id_max_corrida = c.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+        completadas   = frozenset(r[0] for r in c.execute(
+            "SELECT dir FROM scan_carpetas WHERE scan_id = ?", (scan_gen,)))
+    else:
+        with write_lock:
+            # Los checkpoints de escaneos abandonados de esta raíz ya no sirven
+            c.execute(
+                "DELETE FROM scan_carpetas WHERE scan_id IN "
+                "(SELECT id FROM scans WHERE root = ? AND finished_at IS NULL)",
+                (str(root_dir),)
+            )
+            # Las filas con id mayor que este (AUTOINCREMENT) son las insertadas ahora
+            id_max_previo = c.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+            c.execute(
+                "INSERT INTO scans (root, started_at, lotes, incremental, id_max_previo) "
+                "VALUES (?, ?, 0, ?, ?)",
+                (str(root_dir), datetime.now(), int(incremental), id_max_previo)
+            )
+            scan_gen = c.lastrowid
+            conn.commit()
+        id_max_corrida = id_max_previo
+
+    modo = []
+    if incremental:
+        modo.append("incremental")
+    if workers > 1:
+        modo.append(f"{workers} hilos")
+    print(f"📂 Escaneando: {root_dir}{'  (' + ', '.join(modo) + ')' if modo else ''}")
+    if pendiente is not None:
+        print(f"⏯️  Reanudando escaneo #{scan_gen}: {len(completadas)} carpetas ya completas, "
+              f"{pendiente['lotes']} lotes guardados.")
+
+    crono = CronometroEtapas() if tiempos else SIN_CRONO
+
+    # En modo incremental: { path: (id, size, modified_at, missing_since, inode) }
+    t = crono.reloj()
+    conocidos = _cargar_conocidos(c, root_dir) if incremental else None
+    if conocidos is not None:
+        progreso.total_estimado = len(conocidos)
+    else:
+        progreso.total_estimado = c.execute(
+            "SELECT COUNT(*) FROM files WHERE resource_type = 'local' AND path >= ? AND path < ?",
+            path_prefix_range(root_dir)
+        ).fetchone()[0] or None
+    crono.sumar("consultas_bd", t)
+    progreso.scan_id = scan_gen
+    progreso.fase    = "recorriendo"
+    # ids vistos sin cambios (no se reescriben, así que no reciben scan_gen)
+    vistos_sin_cambios = []
+    if completadas and conocidos:
+        # Lo que no cambió en las carpetas ya completas no quedó sellado:
+        # se da por visto (lo que sí se escribió ya tiene scan_gen)
+        vistos_sin_cambios.extend(
+            v[0] for p, v in conocidos.items()
+            if v[3] is None and os.path.dirname(p) in completadas
+        )
 
-    count_new       = 0
-    count_updated   = 0
+    excl            = cargar_exclusiones(reglas)
+    escritor        = _EscritorLotes(conn, scan_gen, crono)
+    count_unchanged = 0
     count_skipped   = 0
     count_errors    = 0
-    lote_actual     = 0
+    examinados      = 0
+    interrumpido    = False
 
-    for root, dirs, files in os.walk(root_dir):
-        # Saltar carpetas ocultas / de sistema
-        dirs[:] = [
-            d for d in dirs
-            if not d.lower().startswith(CARPETAS_SKIP_PREFIJOS)
-        ]
+    def _publicar():
+        progreso.examinados   = examinados
+        progreso.nuevos       = escritor.count_new
+        progreso.actualizados = escritor.count_updated
+        progreso.sin_cambios  = count_unchanged
+        progreso.omitidos     = count_skipped
+        progreso.errores      = count_errors + escritor.count_errors
 
-        for file in files:
-            # ── Construcción segura del path ──────────────────────────────
-            try:
-                file_path = Path(root) / file
-                path_str  = str(file_path)
-            except Exception:
-                count_errors += 1
-                continue
+    if workers > 1:
+        recorrido = _walk_paralelo(root_dir, workers, excl, completadas, crono)
+    else:
+        recorrido = _walk_secuencial(root_dir, excl, completadas, crono)
 
-            # ── Regla 1: ignorar archivos de sistema/basura ───────────────
-            if _es_ignorable(file_path):
+    try:
+        for estado, registro in recorrido:
+            if estado == "carpeta":
+                escritor.terminar_carpeta(registro)
+                continue
+            examinados += 1
+            if not examinados & 255:
+                _publicar()
+                if cancelar is not None and cancelar.is_set():
+                    interrumpido = True
+                    break
+            if estado == "omitido":
                 count_skipped += 1
                 continue
+            if estado == "error":
+                count_errors += 1
+                continue
+            if estado == "recorte":
+                escritor.agregar_si_falta(registro)
+                continue
 
-            # ── Regla 2: path demasiado largo para Windows ────────────────
-            if len(path_str) > 260:
-                # Intentamos con el prefijo \\?\ que levanta el límite
-                path_str_ext = "\\\\?\\" + path_str
-                try:
-                    file_path_ext = Path(path_str_ext)
-                    stats = file_path_ext.stat()
-                except Exception:
-                    # Si aún falla, guardamos el registro con datos básicos
-                    # usando el nombre recortado — el path queda truncado
-                    filename_guardado = _recortar_nombre(file)
-                    path_guardado     = path_str[:255]  # recorte de emergencia
-                    extension         = file_path.suffix.lower()
-                    try:
-                        c.execute(
-                            "SELECT id FROM files WHERE path = ?",
-                            (path_guardado,)
-                        )
-                        if not c.fetchone():
-                            c.execute(
-                                "INSERT INTO files (path, filename, extension, size, created_at, modified_at) "
-                                "VALUES (?, ?, ?, ?, ?, ?)",
-                                (path_guardado, filename_guardado, extension,
-                                 0, datetime.now(), datetime.now())
-                            )
-                            count_new += 1
-                            lote_actual += 1
-                    except Exception:
-                        count_errors += 1
+            path_str, _, _, size, _, modified_at, inode, _ = registro
+
+            # ── Modo incremental: saltar lo que no cambió ────────────────────
+            # (una fila sin inode se reescribe una vez para completarlo)
+            if conocidos is not None:
+                previo = conocidos.get(path_str)
+                if (previo and previo[1] == size and previo[2] == str(modified_at)
+                        and previo[3] is None and (previo[4] is not None or inode is None)):
+                    vistos_sin_cambios.append(previo[0])
+                    count_unchanged += 1
                     continue
-                # Si el prefijo funcionó, usamos stats de la ruta extendida
-                size        = stats.st_size
-                created_at  = datetime.fromtimestamp(stats.st_ctime)
-                modified_at = datetime.fromtimestamp(stats.st_mtime)
-                extension   = file_path.suffix.lower()
-                filename_guardado = _recortar_nombre(file)
+                escritor.agregar(registro, existe=previo is not None)
             else:
-                # ── Caso normal ───────────────────────────────────────────
-                try:
-                    stats = file_path.stat()
-                except PermissionError:
-                    count_errors += 1
-                    continue
-                except Exception:
-                    count_errors += 1
-                    continue
-                size              = stats.st_size
-                created_at        = datetime.fromtimestamp(stats.st_ctime)
-                modified_at       = datetime.fromtimestamp(stats.st_mtime)
-                extension         = file_path.suffix.lower()
-                filename_guardado = _recortar_nombre(file)
+                escritor.agregar(registro)
+    except KeyboardInterrupt:
+        interrumpido = True
 
-            # ── Insertar o actualizar en BD ───────────────────────────────
-            try:
-                c.execute("SELECT id FROM files WHERE path = ?", (path_str,))
-                existing = c.fetchone()
-
-                if existing:
-                    c.execute(
-                        "UPDATE files SET size=?, modified_at=?, created_at=? WHERE id=?",
-                        (size, modified_at, created_at, existing['id'])
-                    )
-                    count_updated += 1
-                else:
-                    c.execute(
-                        "INSERT INTO files (path, filename, extension, size, created_at, modified_at) "
-                        "VALUES (?, ?, ?, ?, ?, ?)",
-                        (path_str, filename_guardado, extension,
-                         size, created_at, modified_at)
-                    )
-                    count_new += 1
-
-                lote_actual += 1
-
-                # ── Commit por lotes ──────────────────────────────────────
-                if lote_actual >= BATCH_SIZE:
-                    conn.commit()
-                    lote_actual = 0
-                    print(f"  💾 Lote guardado — nuevos: {count_new}, actualizados: {count_updated} …")
-
-            except Exception as e:
-                count_errors += 1
+    if interrumpido:
+        # Se guarda lo pendiente con su checkpoint; el resto queda para reanudar
+        recorrido.close()
+        escritor.volcar()
+        conn.close()
+        _publicar()
+        progreso.fase = "interrumpido"
+        progreso.fin  = time.monotonic()
+        if crono.activo:
+            progreso.tiempos = crono.como_dict()
+        print(f"\n⏸️  Escaneo #{scan_gen} interrumpido. Lo ya guardado se conserva; "
+              f"continúa con --reanudar.")
+        return progreso
 
-    # Commit final con lo que quede en el buffer
-    conn.commit()
+    # Volcado final con lo que quede en el buffer
+    escritor.volcar()
+    _publicar()
+    progreso.fase = "finalizando"
+
+    with write_lock:
+        t = crono.reloj()
+        _registrar_vistos(conn, vistos_sin_cambios)
+        crono.sumar("vistos", t, len(vistos_sin_cambios))
+        t = crono.reloj()
+        count_excluded = _apartar_excluidos(conn, root_dir, scan_gen, excl, purgar)
+        crono.sumar("excluidos", t)
+
+    # Fuera del lock: leer archivos para hashearlos no bloquea a los demás
+    # escaneos (temp.vistos es de esta conexión y sigue ahí)
+    t = crono.reloj()
+    hasheados_mov = _hashear_candidatos(conn, root_dir, scan_gen, id_max_previo)
+    crono.sumar("hash_movimientos", t, hasheados_mov)
+
+    with write_lock:
+        t = crono.reloj()
+        count_moved, movidos_corrida = _detectar_movimientos(
+            conn, root_dir, scan_gen, id_max_previo, id_max_corrida)
+        crono.sumar("movimientos", t)
+        t = crono.reloj()
+        count_missing = _procesar_ausentes(conn, root_dir, scan_gen, purgar)
+        crono.sumar("ausentes", t)
+        conn.execute("DROP TABLE IF EXISTS temp.vistos")
+
+    res_hash = None
+    if hashear:
+        print(f"  #️⃣  Calculando hashes ({hashear}) …")
+        t = crono.reloj()
+        res_hash = hashear_pendientes(conn, root_dir, parcial=(hashear == "parcial"))
+        crono.sumar("hashes", t, res_hash['hasheados'])
+    with write_lock:
+        c.execute("UPDATE scans SET finished_at = ? WHERE id = ?", (datetime.now(), scan_gen))
+        c.execute("DELETE FROM scan_carpetas WHERE scan_id = ?", (scan_gen,))
+        conn.commit()
     conn.close()
 
+    # escritor.count_new cuenta solo lo insertado en esta corrida (al reanudar,
+    # no lo de antes de la interrupción): se restan solo sus movimientos
+    count_new     = escritor.count_new - movidos_corrida
+    count_updated = escritor.count_updated
+    count_errors += escritor.count_errors
+
+    progreso.nuevos        = count_new
+    progreso.errores       = count_errors
+    progreso.movidos       = count_moved
+    progreso.desaparecidos = count_missing
+    progreso.excluidos     = count_excluded
+    progreso.hasheados     = res_hash['hasheados'] if res_hash is not None else None
+    progreso.fase          = "completo"
+    progreso.fin           = time.monotonic()
+    if crono.activo:
+        progreso.tiempos = crono.como_dict()
+
     print(f"\n✅ Escaneo completo.")
     print(f"   📥 Nuevos       : {count_new}")
     print(f"   🔄 Actualizados : {count_updated}")
-    print(f"   ⏭️  Omitidos     : {count_skipped}  (archivos de sistema)")
+    if incremental:
+        print(f"   💤 Sin cambios  : {count_unchanged}")
+    print(f"   🚚 Movidos      : {count_moved}  (conservan tags y descripciones)")
+    print(f"   🗑️  Desaparecidos: {count_missing}  ({'purgados' if purgar else 'marcados'})")
+    if count_excluded:
+        print(f"   🚫 Excluidos    : {count_excluded}  (ya indexados, ahora excluidos por las reglas; "
+              f"{'purgados' if purgar else 'marcados, conservan tags y descripciones'})")
+    if res_hash is not None:
+        print(f"   #️⃣  Hasheados    : {res_hash['hasheados']}  (errores: {res_hash['errores']})")
+    print(f"   ⏭️  Omitidos     : {count_skipped}  (reglas de exclusión)")
     print(f"   ❌ Errores      : {count_errors}")
+    aciertos = excl.resumen()
+    if aciertos:
+        print(f"\n   🚫 Reglas de exclusión (archivos o carpetas excluidos):")
+        for regla, n in aciertos:
+            print(f"      {regla:<24} {n}")
+    if progreso.tiempos:
+        print(f"\n   ⏱️  Tiempo por etapa (total {progreso.fin - progreso.inicio:.2f}s"
+              f"{', sumando hilos' if workers > 1 else ''}):")
+        for etapa, v in progreso.tiempos.items():
+            print(f"      {etapa:<14} {v['segundos']:>9.3f}s  ({v['veces']} veces)")
+    return progreso
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        scan_directory(sys.argv[1])
+    import argparse
+    parser = argparse.ArgumentParser(description="Indexa un directorio en files.db")
+    parser.add_argument("ruta", help="Directorio a escanear")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Solo escribe archivos nuevos o modificados")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Hilos para recorrer carpetas en paralelo (NAS/red)")
+    parser.add_argument("--purgar", action="store_true",
+                        help="Borra (en vez de marcar) los archivos que ya no existen")
+    parser.add_argument("--hash", choices=["completo", "parcial"], default=None,
+                        help="Calcula el hash de contenido de lo nuevo/modificado")
+    parser.add_argument("--reglas", default=REGLAS_PATH,
+                        help="Archivo de exclusiones estilo .gitignore")
+    parser.add_argument("--reanudar", action="store_true",
+                        help="Retoma el último escaneo interrumpido de esta carpeta")
+    parser.add_argument("--tiempos", action="store_true",
+                        help="Mide y muestra el tiempo de cada etapa del escaneo")
+    parser.add_argument("--profile", metavar="ARCHIVO",
+                        help="Perfila el escaneo con cProfile y guarda las estadísticas (pstats)")
+    args = parser.parse_args()
+    opciones = dict(incremental=args.incremental, workers=args.workers, purgar=args.purgar,
+                    hashear=args.hash, reglas=args.reglas, reanudar=args.reanudar,
+                    tiempos=args.tiempos)
+    if args.profile:
+        import cProfile
+        import pstats
+        perfil = cProfile.Profile()
+        perfil.runcall(scan_directory, args.ruta, **opciones)
+        perfil.dump_stats(args.profile)
+        print(f"\n📈 Perfil guardado en {args.profile} (abrirlo con: python -m pstats {args.profile})")
+        pstats.Stats(perfil).sort_stats("cumulative").print_stats(15)
     else:
-        print("Uso: python scanner.py <ruta_directorio>")
+        scan_directory(args.ruta, **opciones)
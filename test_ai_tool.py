@@ -21,7 +21,8 @@ sys.path.append(os.getcwd())
 
 # Import main
 try:
-    from main import generate_ai_metadata, scan_files
+    from main import generate_ai_metadata
+    from scanner import scan_directory
 except Exception as e:
     print(f"Error importing main: {e}")
     sys.exit(1)
@@ -30,7 +31,8 @@ except Exception as e:
 db_path = "files.db"
 if not os.path.exists(db_path):
     print("Database not found. Scanning scanning current dir...")
-    print(scan_files(os.getcwd()))
+    # scan_files only starts a background job; scan here and wait for it
+    scan_directory(os.getcwd())
 
 # Find a file to test
 import sqlite3
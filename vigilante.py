@@ -0,0 +1,475 @@
+"""
+vigilante.py
+────────────
+Modo vigilante: mantiene files.db al día sin re-escanear todo el árbol.
+
+Se suscribe a las carpetas que ya se escanearon antes (tabla scans) y aplica
+a `files` los eventos de creación, modificación, borrado y renombrado.
+
+    - Backend inotify (Linux, vía ctypes, sin dependencias extra).
+    - Backend de sondeo (cualquier sistema): compara instantáneas periódicas.
+
+Los eventos se agrupan en micro-lotes: tras el primer evento se sigue
+escuchando hasta que haya SILENCIO_SEG sin eventos nuevos (o se llegue a
+VENTANA_MAX_SEG), y todo el lote se escribe en una única transacción. Así,
+descomprimir un zip de 50k archivos no produce 50k commits.
+
+Uso:
+    python vigilante.py                      # carpetas escaneadas antes
+    python vigilante.py C:\\Users\\yo\\Docs    # carpetas concretas
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+from database import get_db_connection, ensure_schema, path_prefix_range
+from scanner import (
+    _examinar_archivo, _carpeta_saltable, _SQL_UPSERT, scan_directory, EXCLUSIONES,
+)
+
+# Espera sin eventos que cierra un micro-lote
+SILENCIO_SEG = 0.5
+
+# Duración máxima de un micro-lote aunque los eventos no paren
+VENTANA_MAX_SEG = 5.0
+
+# Intervalo entre instantáneas del backend de sondeo
+INTERVALO_SONDEO_SEG = 10.0
+
+# tipo: 'creado' | 'modificado' | 'borrado' | 'movido' | 'desborde'
+Evento = namedtuple("Evento", "tipo ruta destino es_dir")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# BACKENDS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _relativa(ruta: str, raices: list):
+    """Ruta relativa a la raíz vigilada que la contiene (solo para reglas ancladas)."""
+    if not EXCLUSIONES.usa_rutas:
+        return None
+    for raiz in raices:
+        if ruta.startswith(raiz + os.sep):
+            return ruta[len(raiz) + 1:]
+    return None
+
+
+def _podar(root: str, dirs: list, raices: list):
+    """Quita de dirs (in situ, como en os.walk) las carpetas excluidas por regla."""
+    dirs[:] = [
+        d for d in dirs
+        if not _carpeta_saltable(d, rel=_relativa(os.path.join(root, d), raices))
+    ]
+
+
+class BackendVigilancia:
+    """Interfaz común: agregar raíces y leer eventos."""
+    nombre = "base"
+    raices = ()
+
+    def agregar_raiz(self, raiz: str):
+        raise NotImplementedError
+
+    def leer(self, timeout: float) -> list:
+        """Devuelve la lista de eventos disponibles (vacía si venció el timeout)."""
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class BackendInotify(BackendVigilancia):
+    """inotify de Linux: un watch por carpeta, agregados recursivamente."""
+    nombre = "inotify"
+
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW  = 0x00004000
+    IN_IGNORED     = 0x00008000
+    IN_ONLYDIR     = 0x01000000
+    IN_ISDIR       = 0x40000000
+
+    MASCARA = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+
+    _CABECERA = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify solo está disponible en Linux")
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self.dirs = {}   # wd → ruta de la carpeta
+        self.raices = []
+
+    def _vigilar(self, carpeta: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(carpeta), self.MASCARA)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            # ENOSPC: se agotó fs.inotify.max_user_watches
+            if errno == 28:
+                raise OSError(errno, "Límite de inotify alcanzado (fs.inotify.max_user_watches)")
+            return
+        self.dirs[wd] = carpeta
+
+    def _vigilar_arbol(self, raiz: str, eventos=None):
+        """Agrega watches a raiz y sus subcarpetas. Si se pasa `eventos`, emite
+        'creado' para los archivos que ya había (carpetas recién creadas)."""
+        for root, dirs, files in os.walk(raiz):
+            _podar(root, dirs, self.raices)
+            self._vigilar(root)
+            if eventos is not None:
+                eventos.extend(Evento("creado", os.path.join(root, f), None, False) for f in files)
+
+    def agregar_raiz(self, raiz: str):
+        self.raices.append(raiz)
+        self._vigilar_arbol(raiz)
+
+    def _renombrar_watches(self, origen: str, destino: str):
+        prefijo = origen + os.sep
+        for wd, ruta in list(self.dirs.items()):
+            if ruta == origen:
+                self.dirs[wd] = destino
+            elif ruta.startswith(prefijo):
+                self.dirs[wd] = destino + ruta[len(origen):]
+
+    def leer(self, timeout: float) -> list:
+        listos, _, _ = select.select([self.fd], [], [], timeout)
+        if not listos:
+            return []
+        try:
+            datos = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        eventos, movidos_desde = [], {}   # cookie → (ruta, es_dir)
+        pos = 0
+        while pos < len(datos):
+            wd, mask, cookie, largo = self._CABECERA.unpack_from(datos, pos)
+            pos += self._CABECERA.size
+            nombre = os.fsdecode(datos[pos:pos + largo].rstrip(b"\0"))
+            pos += largo
+
+            if mask & self.IN_Q_OVERFLOW:
+                eventos.append(Evento("desborde", None, None, False))
+                continue
+            if mask & self.IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            carpeta = self.dirs.get(wd)
+            if carpeta is None or not nombre:
+                continue
+            ruta   = os.path.join(carpeta, nombre)
+            es_dir = bool(mask & self.IN_ISDIR)
+            if es_dir and _carpeta_saltable(nombre, rel=_relativa(ruta, self.raices)):
+                continue
+
+            if mask & self.IN_MOVED_FROM:
+                movidos_desde[cookie] = (ruta, es_dir)
+            elif mask & self.IN_MOVED_TO:
+                origen = movidos_desde.pop(cookie, None)
+                if origen:
+                    eventos.append(Evento("movido", origen[0], ruta, es_dir))
+                    if es_dir:
+                        self._renombrar_watches(origen[0], ruta)
+                elif es_dir:
+                    # Llegó desde fuera de lo vigilado: es como una carpeta nueva
+                    self._vigilar_arbol(ruta, eventos)
+                else:
+                    eventos.append(Evento("creado", ruta, None, False))
+            elif mask & self.IN_CREATE:
+                if es_dir:
+                    self._vigilar_arbol(ruta, eventos)
+                else:
+                    eventos.append(Evento("creado", ruta, None, False))
+            elif mask & self.IN_DELETE:
+                eventos.append(Evento("borrado", ruta, None, es_dir))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_ATTRIB):
+                if not es_dir:
+                    eventos.append(Evento("modificado", ruta, None, False))
+
+        # Movidos hacia fuera de lo vigilado: para nosotros, borrados
+        for ruta, es_dir in movidos_desde.values():
+            eventos.append(Evento("borrado", ruta, None, es_dir))
+        return eventos
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+class BackendSondeo(BackendVigilancia):
+    """Alternativa portable: compara instantáneas {path: (size, mtime, inode)}."""
+    nombre = "sondeo"
+
+    def __init__(self, intervalo: float = INTERVALO_SONDEO_SEG):
+        self.intervalo = intervalo
+        self.raices = []
+        self.instantanea = {}
+        self.proxima = 0.0
+
+    def _tomar(self) -> dict:
+        foto = {}
+        for raiz in self.raices:
+            for root, dirs, files in os.walk(raiz):
+                _podar(root, dirs, self.raices)
+                for f in files:
+                    ruta = os.path.join(root, f)
+                    try:
+                        st = os.stat(ruta)
+                    except OSError:
+                        continue
+                    foto[ruta] = (st.st_size, st.st_mtime_ns, st.st_ino or None)
+        return foto
+
+    def agregar_raiz(self, raiz: str):
+        self.raices.append(raiz)
+        self.instantanea = self._tomar()
+        self.proxima = time.monotonic() + self.intervalo
+
+    def leer(self, timeout: float) -> list:
+        espera = self.proxima - time.monotonic()
+        if espera > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(espera, 0))
+        self.proxima = time.monotonic() + self.intervalo
+
+        nueva = self._tomar()
+        anterior, self.instantanea = self.instantanea, nueva
+        borrados = {p: v for p, v in anterior.items() if p not in nueva}
+        creados  = {p: v for p, v in nueva.items() if p not in anterior}
+
+        eventos = []
+        # Un borrado y una creación con el mismo inode y tamaño es un renombrado
+        por_inode = {(v[2], v[0]): p for p, v in borrados.items() if v[2]}
+        for ruta, v in creados.items():
+            origen = por_inode.pop((v[2], v[0]), None) if v[2] else None
+            if origen:
+                del borrados[origen]
+                eventos.append(Evento("movido", origen, ruta, False))
+            else:
+                eventos.append(Evento("creado", ruta, None, False))
+        eventos.extend(Evento("borrado", p, None, False) for p in borrados)
+        eventos.extend(
+            Evento("modificado", p, None, False)
+            for p, v in nueva.items() if p in anterior and anterior[p] != v
+        )
+        return eventos
+
+
+def crear_backend(tipo: str = "auto") -> BackendVigilancia:
+    """tipo: 'auto' (inotify si se puede, si no sondeo), 'inotify' o 'sondeo'."""
+    if tipo in ("auto", "inotify"):
+        try:
+            return BackendInotify()
+        except OSError as e:
+            if tipo == "inotify":
+                raise
+            print(f"ℹ️  inotify no disponible ({e}); usando sondeo.")
+    return BackendSondeo()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# APLICAR EVENTOS A LA BD
+# ─────────────────────────────────────────────────────────────────────────────
+
+def raices_escaneadas(conn) -> list:
+    """Carpetas escaneadas antes que aún existen, sin las anidadas en otras."""
+    rutas = sorted({
+        r[0] for r in conn.execute("SELECT DISTINCT root FROM scans WHERE finished_at IS NOT NULL")
+        if os.path.isdir(r[0])
+    })
+    raices = []
+    for ruta in rutas:
+        if not any(ruta.startswith(path_prefix_range(r)[0]) for r in raices):
+            raices.append(ruta)
+    return raices
+
+
+def aplicar_eventos(conn, eventos: list, scan_gen: int, raices: list = ()) -> dict:
+    """
+    Aplica un micro-lote de eventos en una sola transacción:
+      1. Renombrados, en orden: se reescribe el path de la fila (o de todas
+         las filas bajo una carpeta), así se conservan tags y descripciones.
+      2. Cada ruta tocada se vuelve a examinar: si existe se inserta/actualiza
+         (mismas reglas que el escáner); si no, se marca con missing_since.
+    raices son las carpetas vigiladas, para las reglas de exclusión ancladas.
+    Devuelve contadores por tipo de cambio.
+    """
+    renombres = [e for e in eventos if e.tipo == "movido"]
+    sucias, carpetas_nuevas = {}, []
+    for e in eventos:
+        if e.tipo == "movido":
+            sucias[e.destino] = e.es_dir
+        elif e.tipo in ("creado", "modificado", "borrado"):
+            sucias[e.ruta] = e.es_dir
+
+    res = {'renombrados': 0, 'escritos': 0, 'borrados': 0, 'omitidos': 0}
+    ahora = datetime.now()
+    c = conn.cursor()
+    conn.execute("BEGIN")
+    try:
+        for e in renombres:
+            if e.es_dir:
+                desde, hasta = path_prefix_range(e.ruta)
+                c.execute(
+                    "UPDATE files SET path = ? || substr(path, ?) "
+                    "WHERE resource_type = 'local' AND path >= ? AND path < ?",
+                    (e.destino, len(e.ruta) + 1, desde, hasta)
+                )
+                if c.rowcount == 0:
+                    carpetas_nuevas.append(e.destino)
+                sucias.pop(e.destino, None)
+            else:
+                origen = c.execute(
+                    "SELECT id FROM files WHERE path = ? AND resource_type = 'local'", (e.ruta,)
+                ).fetchone()
+                if origen is None:
+                    # Origen sin indexar (p. ej. temporal de un guardado atómico):
+                    # el destino se re-examina y conserva su fila y sus tags
+                    continue
+                # El archivo indexado reemplazó al destino
+                c.execute("DELETE FROM files WHERE path = ? AND resource_type = 'local'", (e.destino,))
+                nombre = os.path.basename(e.destino)
+                c.execute(
+                    "UPDATE files SET path = ?, filename = ?, extension = ? "
+                    "WHERE path = ? AND resource_type = 'local'",
+                    (e.destino, nombre, Path(nombre).suffix.lower(), e.ruta)
+                )
+            res['renombrados'] += c.rowcount > 0
+
+        for carpeta in carpetas_nuevas:
+            for root, dirs, files in os.walk(carpeta):
+                _podar(root, dirs, raices)
+                for f in files:
+                    sucias[os.path.join(root, f)] = False
+
+        filas, ausentes = [], []
+        for ruta, es_dir in sucias.items():
+            if os.path.isdir(ruta):
+                continue
+            if not os.path.exists(ruta):
+                ausentes.append(ruta)
+                continue
+            estado, registro = _examinar_archivo(os.path.dirname(ruta), os.path.basename(ruta),
+                                                 rel=_relativa(ruta, raices))
+            if estado == "ok":
+                filas.append(registro + (scan_gen,))
+            else:
+                res['omitidos'] += 1
+
+        c.executemany(_SQL_UPSERT, filas)
+        res['escritos'] = len(filas)
+        for ruta in ausentes:
+            desde, hasta = path_prefix_range(ruta)
+            c.execute(
+                "UPDATE files SET missing_since = ? "
+                "WHERE resource_type = 'local' AND missing_since IS NULL "
+                "AND (path = ? OR (path >= ? AND path < ?))",
+                (ahora, ruta, desde, hasta)
+            )
+            res['borrados'] += c.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return res
+
+
+def vigilar(raices: list = None, backend: str = "auto",
+            silencio: float = SILENCIO_SEG, ventana_max: float = VENTANA_MAX_SEG):
+    """Bucle principal del vigilante. Termina con Ctrl+C."""
+    conn = get_db_connection()
+    ensure_schema(conn)
+    if not raices:
+        raices = raices_escaneadas(conn)
+    raices = [str(Path(r).resolve()) for r in raices]
+    if not raices:
+        print("❌ No hay carpetas para vigilar. Escanea alguna primero con scanner.py.")
+        conn.close()
+        return
+
+    vigia = crear_backend(backend)
+    try:
+        for raiz in raices:
+            vigia.agregar_raiz(raiz)
+    except OSError as e:
+        if backend != "auto":
+            raise
+        print(f"ℹ️  {e}; usando sondeo.")
+        vigia.cerrar()
+        vigia = BackendSondeo()
+        for raiz in raices:
+            vigia.agregar_raiz(raiz)
+
+    c = conn.cursor()
+    c.execute("INSERT INTO scans (root, started_at) VALUES (?, ?)",
+              (os.pathsep.join(raices), datetime.now()))
+    scan_gen = c.lastrowid
+    conn.commit()
+
+    print(f"👁️  Vigilando {len(raices)} carpeta(s) con backend '{vigia.nombre}' (Ctrl+C para salir):")
+    for r in raices:
+        print(f"   📂 {r}")
+
+    try:
+        while True:
+            eventos = vigia.leer(timeout=1.0)
+            if not eventos:
+                continue
+            # ── Debounce: seguir juntando hasta que haya silencio ─────────
+            limite = time.monotonic() + ventana_max
+            while time.monotonic() < limite:
+                mas = vigia.leer(timeout=silencio)
+                if not mas:
+                    break
+                eventos.extend(mas)
+
+            if any(e.tipo == "desborde" for e in eventos):
+                # Se perdieron eventos: solo queda un re-escaneo incremental
+                print("⚠️  Cola de eventos desbordada; re-escaneando en modo incremental.")
+                for raiz in raices:
+                    scan_directory(raiz, incremental=True)
+                continue
+
+            res = aplicar_eventos(conn, eventos, scan_gen, raices)
+            print(f"  💾 {time.strftime('%H:%M:%S')} — {len(eventos)} eventos: "
+                  f"escritos {res['escritos']}, renombrados {res['renombrados']}, "
+                  f"desaparecidos {res['borrados']}")
+    except KeyboardInterrupt:
+        print("\n👋 Vigilante detenido.")
+    finally:
+        c.execute("UPDATE scans SET finished_at = ? WHERE id = ?", (datetime.now(), scan_gen))
+        conn.commit()
+        vigia.cerrar()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Mantiene files.db al día con los cambios del disco")
+    parser.add_argument("rutas", nargs="*", help="Carpetas a vigilar (por defecto, las ya escaneadas)")
+    parser.add_argument("--backend", choices=["auto", "inotify", "sondeo"], default="auto")
+    parser.add_argument("--silencio", type=float, default=SILENCIO_SEG,
+                        help="Segundos sin eventos que cierran un micro-lote")
+    parser.add_argument("--ventana-max", type=float, default=VENTANA_MAX_SEG,
+                        help="Duración máxima de un micro-lote")
+    args = parser.parse_args()
+    vigilar(args.rutas, backend=args.backend, silencio=args.silencio, ventana_max=args.ventana_max)